@@ -0,0 +1,197 @@
+import os
+import numpy as np
+import pandas as pd
+from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing import stage_cache
+from nifd_casfri_preprocessing import log_helper
+from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
+from nifd_casfri_preprocessing.gis_helpers import wgs84_area
+from nifd_casfri_preprocessing.process_for_cbm import ParquetGeoDataset
+
+logger = log_helper.get_logger()
+
+# casfri_area is in hectares, projected raster units are metres
+_HECTARES_PER_SQUARE_METRE = 1e-4
+
+CAS_ID_OUTPUT = "area_reconciliation_by_cas_id.parquet"
+INVENTORY_OUTPUT = "area_reconciliation_by_inventory.csv"
+
+
+def _get_raster_id_totals(
+    ds: ParquetGeoDataset,
+) -> tuple[np.ndarray, np.ndarray]:
+    reader = ds.get_raster_reader()
+    with gdal_helpers.raster_session():
+        if ds.wgs84:
+            _, _, _, origin_y, _, y_res = (
+                gdal_helpers.get_raster_geo_transform(ds.base_raster_path)
+            )
+            y_size = gdal_helpers.get_raster_dimension(
+                ds.base_raster_path
+            ).y_size
+            return wgs84_area.get_value_totals(
+                reader,
+                wgs84_area.compute_areas(y_res, y_size, origin_y)
+                * _HECTARES_PER_SQUARE_METRE,
+            )
+        geo_transform = gdal_helpers.get_raster_geo_transform(
+            ds.base_raster_path
+        )
+        counts, _ = wgs84_area.get_value_totals(reader)
+    pixel_area = abs(geo_transform[1] * geo_transform[5])
+    return counts, counts * pixel_area * _HECTARES_PER_SQUARE_METRE
+
+
+def _index_totals(totals: np.ndarray, raster_ids: np.ndarray) -> np.ndarray:
+    result = np.zeros(raster_ids.shape[0], dtype=totals.dtype)
+    in_range = raster_ids < totals.shape[0]
+    result[in_range] = totals[raster_ids[in_range]]
+    return result
+
+
+def reconcile_areas(
+    data_dir: str, wgs84: bool = False, memory_limit_mb: int = None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Compare the rasterized area of each cas_id of an extracted inventory
+    with its polygon casfri_area.  The raster is read in chunks so that
+    memory use is bounded by the memory limit and the size of the
+    geo_lookup and cas tables.
+
+    Args:
+        data_dir (str): directory containing an extracted casfri parquet
+            inventory dataset
+        wgs84 (bool, optional): if set cas_id_wgs84.tiff is compared, with
+            the area of each pixel computed from its latitude. Otherwise
+            cas_id.tiff is compared. Defaults to False.
+        memory_limit_mb (int, optional): approximate memory limit for the
+            raster chunks, see :py:class:`RasterChunkReader`. Defaults to
+            None.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: the area comparison of each
+            cas_id, and the totals of each inventory.  Areas are in
+            hectares.
+    """
+    ds = ParquetGeoDataset(data_dir, wgs84, memory_limit_mb)
+    logger.info(f"counting pixels of {ds.base_raster_path}")
+    counts, areas = _get_raster_id_totals(ds)
+
+    geo_lookup = ds.get_table("geo_lookup", ["cas_id", "raster_id"])
+    raster_ids = geo_lookup["raster_id"].to_numpy(dtype="int64")
+    raster_totals = (
+        pd.DataFrame(
+            {
+                "cas_id": geo_lookup["cas_id"],
+                "pixel_count": _index_totals(counts, raster_ids),
+                "raster_area": _index_totals(areas, raster_ids),
+            }
+        )
+        .groupby("cas_id", observed=True)
+        .sum()
+    )
+    matched = np.zeros(counts.shape[0], dtype=bool)
+    matched[raster_ids[raster_ids < counts.shape[0]]] = True
+    unmatched_pixel_count = int(counts[~matched].sum())
+    if unmatched_pixel_count:
+        logger.warning(
+            f"{unmatched_pixel_count} pixels have raster ids that are not "
+            "defined in geo_lookup"
+        )
+
+    by_cas_id = ds.get_table(
+        "cas", ["cas_id", "inventory_id", "casfri_area"]
+    ).merge(raster_totals, how="left", left_on="cas_id", right_index=True)
+    by_cas_id["has_geometry"] = by_cas_id["cas_id"].isin(geo_lookup["cas_id"])
+    by_cas_id["pixel_count"] = (
+        by_cas_id["pixel_count"].fillna(0).astype("int64")
+    )
+    by_cas_id["raster_area"] = by_cas_id["raster_area"].fillna(0.0)
+    by_cas_id["area_delta"] = (
+        by_cas_id["raster_area"] - by_cas_id["casfri_area"]
+    )
+    by_cas_id["relative_area_delta"] = by_cas_id["area_delta"] / by_cas_id[
+        "casfri_area"
+    ].where(by_cas_id["casfri_area"] > 0)
+
+    by_cas_id["zero_pixels"] = by_cas_id["has_geometry"] & (
+        by_cas_id["pixel_count"] == 0
+    )
+    by_inventory = by_cas_id.groupby("inventory_id", observed=True).agg(
+        cas_id_count=("cas_id", "size"),
+        no_geometry_count=("has_geometry", lambda x: int((~x).sum())),
+        zero_pixel_count=("zero_pixels", "sum"),
+        casfri_area=("casfri_area", "sum"),
+        raster_area=("raster_area", "sum"),
+    )
+    by_inventory["area_delta"] = (
+        by_inventory["raster_area"] - by_inventory["casfri_area"]
+    )
+    by_inventory["relative_area_delta"] = (
+        by_inventory["area_delta"] / by_inventory["casfri_area"]
+    )
+    by_inventory["unmatched_pixel_count"] = unmatched_pixel_count
+    return by_cas_id, by_inventory.reset_index()
+
+
+def write_area_reconciliation(
+    data_dir: str,
+    out_dir: str,
+    wgs84: bool = False,
+    memory_limit_mb: int = None,
+    use_cache: bool = True,
+) -> None:
+    """Write the result of :py:func:`reconcile_areas` to a per-cas_id
+    parquet file and a per-inventory csv file in the specified directory.
+
+    Args:
+        data_dir (str): directory containing an extracted casfri parquet
+            inventory dataset
+        out_dir (str): the output directory
+        wgs84 (bool, optional): see :py:func:`reconcile_areas`. Defaults to
+            False.
+        memory_limit_mb (int, optional): see :py:func:`reconcile_areas`.
+            Defaults to None.
+        use_cache (bool, optional): if set the outputs are not re-created
+            when their inputs are unchanged. Defaults to True.
+    """
+    cas_id_path = os.path.join(out_dir, CAS_ID_OUTPUT)
+    inventory_path = os.path.join(out_dir, INVENTORY_OUTPUT)
+    raster_filename = "cas_id_wgs84.tiff" if wgs84 else "cas_id.tiff"
+    manifest = stage_cache.StageManifest(out_dir)
+    stage_fingerprint = None
+    if use_cache:
+        extraction_manifest = stage_cache.StageManifest(data_dir)
+        stage_fingerprint = stage_cache.fingerprint(
+            dict(
+                raster=stage_cache.input_fingerprint(
+                    os.path.join(data_dir, raster_filename),
+                    extraction_manifest,
+                    "raster_wgs84" if wgs84 else "raster",
+                ),
+                tables={
+                    table: stage_cache.input_fingerprint(
+                        casfri_data.get_table_path(data_dir, table),
+                        extraction_manifest,
+                        "parquet",
+                    )
+                    for table in ["cas", "geo_lookup"]
+                },
+                wgs84=wgs84,
+                version=stage_cache.get_package_version(),
+            )
+        )
+        if manifest.is_current("area_reconciliation", stage_fingerprint):
+            logger.info("area_reconciliation is up to date, skipping")
+            return
+    manifest.invalidate("area_reconciliation")
+    by_cas_id, by_inventory = reconcile_areas(data_dir, wgs84, memory_limit_mb)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    by_cas_id.to_parquet(cas_id_path, index=False)
+    by_inventory.to_csv(inventory_path, index=False)
+    if use_cache:
+        manifest.record(
+            "area_reconciliation",
+            stage_fingerprint,
+            [cas_id_path, inventory_path],
+        )
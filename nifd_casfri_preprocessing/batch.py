@@ -0,0 +1,194 @@
+import os
+from typing import Union
+from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing import process_for_cbm
+from nifd_casfri_preprocessing import log_helper
+from nifd_casfri_preprocessing.notebooks import report_writer
+from nifd_casfri_preprocessing.job_scheduler import Job
+from nifd_casfri_preprocessing.job_scheduler import run_jobs
+
+logger = log_helper.get_logger()
+
+IO_RESOURCE = "io"
+CPU_RESOURCE = "cpu"
+
+
+def get_raw_table_dir(output_dir: str, inventory_id: str) -> str:
+    return os.path.join(output_dir, inventory_id, "raw")
+
+
+def get_processed_dir(output_dir: str, inventory_id: str) -> str:
+    return os.path.join(output_dir, inventory_id, "processed")
+
+
+def get_report_dir(output_dir: str, inventory_id: str) -> str:
+    return os.path.join(output_dir, inventory_id, "report")
+
+
+def get_inventory_jobs(
+    username: str,
+    password: str,
+    host: str,
+    port: str,
+    database: str,
+    output_dir: str,
+    inventory_id: str,
+    resolution: float,
+    age_relative_year: int,
+    wgs84: bool,
+    memory_limit_mb: int = None,
+    max_connections: int = 1,
+    batch_size: int = None,
+    partitioned: bool = False,
+    raster_profile: str = None,
+) -> list[Job]:
+    """Get the extract, process and summary jobs for a single inventory.
+    The database bound extraction is assigned to the io resource class, and
+    process and summary, which both depend only on the extraction, are
+    assigned to the cpu resource class.
+    """
+    raw_table_dir = get_raw_table_dir(output_dir, inventory_id)
+    report_dir = get_report_dir(output_dir, inventory_id)
+    extract_job = Job(
+        name=f"{inventory_id}.extract",
+        func=casfri_data.extract_to_parquet_with_raster,
+        args=(
+            username,
+            password,
+            host,
+            port,
+            database,
+            raw_table_dir,
+            inventory_id,
+            resolution,
+        ),
+        kwargs=dict(
+            max_connections=max_connections,
+            batch_size=batch_size,
+            partitioned=partitioned,
+            raster_profile=raster_profile,
+        ),
+        resource=IO_RESOURCE,
+    )
+    process_job = Job(
+        name=f"{inventory_id}.process",
+        func=process_for_cbm.process,
+        kwargs=dict(
+            data_dir=raw_table_dir,
+            wgs84=wgs84,
+            age_relative_year=age_relative_year,
+            out_dir=get_processed_dir(output_dir, inventory_id),
+            memory_limit_mb=memory_limit_mb,
+            raster_profile=raster_profile,
+        ),
+        depends_on=[extract_job.name],
+        resource=CPU_RESOURCE,
+    )
+    summary_job = Job(
+        name=f"{inventory_id}.summary",
+        func=report_writer.generate_report,
+        args=(
+            "summarize_casfri_inventory.md",
+            os.path.join(report_dir, inventory_id),
+        ),
+        kwargs=dict(
+            parameters=dict(
+                inventory_id=inventory_id,
+                raw_data_path=raw_table_dir,
+                output_path=report_dir,
+            )
+        ),
+        depends_on=[extract_job.name],
+        resource=CPU_RESOURCE,
+    )
+    return [extract_job, process_job, summary_job]
+
+
+def run_batch(
+    username: str,
+    password: str,
+    host: str,
+    port: str,
+    database: str,
+    output_dir: str,
+    inventory_ids: Union[list[str], str],
+    resolution: float,
+    age_relative_year: int,
+    wgs84: bool,
+    memory_limit_mb: int = None,
+    max_connections: int = 1,
+    batch_size: int = None,
+    partitioned: bool = False,
+    raster_profile: str = None,
+    io_workers: int = 1,
+    cpu_workers: int = 1,
+) -> dict[str, bool]:
+    """Extract, process and summarize several inventories.  Extraction of
+    one inventory overlaps with the processing and summary of previously
+    extracted inventories.
+
+    Args:
+        username (str): database username
+        password (str): database password
+        host (str): database host
+        port (str): database port
+        database (str): database name
+        output_dir (str): directory into which a subdirectory for each
+            inventory is written
+        inventory_ids (list[str], str): the inventory ids to run, or "all"
+            for every inventory in the database hdr_all table
+        resolution (float): the rasterization resolution
+        age_relative_year (int): the reference year for the age rasters
+        wgs84 (bool): if set, the processed rasters are in wgs84 projection
+        memory_limit_mb (int, optional): the processing memory limit, see
+            :py:func:`process_for_cbm.process`. Defaults to None.
+        max_connections (int, optional): the maximum number of database
+            connections used by each extraction. Defaults to 1.
+        batch_size (int, optional): if set, tables are streamed to parquet
+            in row groups of this size. Defaults to None.
+        partitioned (bool, optional): if set, tables with a layer column are
+            extracted as hive partitioned datasets. Defaults to False.
+        raster_profile (str, optional): the output raster profile, see
+            :py:func:`gdal_helpers.get_raster_profile`. Defaults to None.
+        io_workers (int, optional): the maximum number of concurrent
+            extractions. Defaults to 1.
+        cpu_workers (int, optional): the maximum number of concurrent process
+            and summary jobs. Defaults to 1.
+
+    Returns:
+        dict[str, bool]: the success status of each job by name
+    """
+    if isinstance(inventory_ids, str):
+        if inventory_ids.lower() != "all":
+            raise ValueError(
+                "inventory_ids must be a list of inventory ids or 'all'"
+            )
+        url = str(
+            casfri_data.get_sqlachemy_url(
+                "postgresql", username, password, host, port, database
+            )
+        )
+        inventory_ids = casfri_data.get_inventory_ids(url)
+    logger.info(f"batch inventory ids: {inventory_ids}")
+    jobs = []
+    for inventory_id in inventory_ids:
+        jobs.extend(
+            get_inventory_jobs(
+                username,
+                password,
+                host,
+                port,
+                database,
+                output_dir,
+                inventory_id,
+                resolution,
+                age_relative_year,
+                wgs84,
+                memory_limit_mb,
+                max_connections,
+                batch_size,
+                partitioned,
+                raster_profile,
+            )
+        )
+    return run_jobs(jobs, {IO_RESOURCE: io_workers, CPU_RESOURCE: cpu_workers})
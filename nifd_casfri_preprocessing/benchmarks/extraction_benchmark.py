@@ -0,0 +1,108 @@
+import sys
+import time
+import argparse
+from typing import Callable
+import pandas as pd
+import pyarrow as pa
+from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing import sql
+
+
+def _time_reader(read: Callable[[], pa.Table], repeats: int) -> tuple:
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        table = read()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, table.num_rows
+
+
+def benchmark_readers(
+    url: str,
+    inventory_id: str,
+    tables: list[str],
+    repeats: int = 3,
+) -> pd.DataFrame:
+    """Compare the time taken to read extraction queries into arrow tables
+    with pandas.read_sql, and with the COPY bulk reader
+    :py:func:`casfri_data.read_copy_batches`.
+
+    Args:
+        url (str): sqlalchemy connection url to the casfri database
+        inventory_id (str): the inventory whose tables are read
+        tables (list[str]): the table names, for example ["lyr", "dst"]
+        repeats (int, optional): the number of times each query is read,
+            the fastest time is reported. Defaults to 3.
+
+    Returns:
+        pd.DataFrame: the best time and rows per second of each table and
+            reader
+    """
+    engine = casfri_data.create_engine(url)
+    results = []
+    try:
+        for table in tables:
+            query = sql.get_inventory_id_fitered_query(table, inventory_id)
+            readers = {
+                "read_sql": lambda: pa.Table.from_pandas(
+                    pd.read_sql(query, engine), preserve_index=False
+                ),
+                "copy": lambda: pa.Table.from_batches(
+                    casfri_data.read_copy_batches(engine, query)
+                ),
+            }
+            for reader, read in readers.items():
+                seconds, rows = _time_reader(read, repeats)
+                results.append([table, reader, rows, seconds, rows / seconds])
+    finally:
+        engine.dispose()
+    return pd.DataFrame(
+        columns=["table", "reader", "rows", "seconds", "rows_per_second"],
+        data=results,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare pandas.read_sql and COPY based extraction of casfri "
+            "tables"
+        )
+    )
+    for db_info in ["host", "port", "database", "username", "password"]:
+        parser.add_argument(
+            f"--{db_info}", help="database connection info", required=True
+        )
+    parser.add_argument(
+        "--inventory_id", help="the inventory id to read", required=True
+    )
+    parser.add_argument(
+        "--tables",
+        help="the tables to read",
+        nargs="+",
+        default=["lyr", "dst"],
+    )
+    parser.add_argument(
+        "--repeats", help="number of reads per table", type=int, default=3
+    )
+    args = parser.parse_args(sys.argv[1:])
+    url = str(
+        casfri_data.get_sqlachemy_url(
+            "postgresql",
+            args.username,
+            args.password,
+            args.host,
+            args.port,
+            args.database,
+        )
+    )
+    print(
+        benchmark_readers(
+            url, args.inventory_id, args.tables, args.repeats
+        ).to_string(index=False)
+    )
+
+
+if __name__ == "__main__":
+    main()
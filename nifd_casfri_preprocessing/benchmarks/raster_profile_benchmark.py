@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
+from nifd_casfri_preprocessing.gis_helpers import raster_chunks
+from nifd_casfri_preprocessing.gis_helpers.raster_bound import RasterBound
+
+
+def _get_windows(
+    raster_bounds: RasterBound, window_size: int, n_windows: int
+) -> list[RasterBound]:
+    rng = np.random.default_rng(0)
+    x_size = min(window_size, raster_bounds.x_size)
+    y_size = min(window_size, raster_bounds.y_size)
+    return [
+        RasterBound(
+            int(rng.integers(0, raster_bounds.x_size - x_size + 1)),
+            int(rng.integers(0, raster_bounds.y_size - y_size + 1)),
+            x_size,
+            y_size,
+        )
+        for _ in range(n_windows)
+    ]
+
+
+def _get_file_size(path: str) -> int:
+    size = os.path.getsize(path)
+    if os.path.exists(f"{path}.ovr"):
+        size += os.path.getsize(f"{path}.ovr")
+    return size
+
+
+def benchmark_profiles(
+    raster_path: str,
+    work_dir: str,
+    profiles: list[str] = None,
+    window_size: int = 512,
+    n_windows: int = 200,
+) -> pd.DataFrame:
+    """Write a copy of a raster with each of the specified raster profiles
+    and compare the write time, file size, and the time taken to read the
+    whole raster and randomly placed windows from it, as done by
+    downstream tiling.
+
+    Args:
+        raster_path (str): path to the benchmarked raster, for example an
+            extracted cas_id.tiff. It is read into memory once.
+        work_dir (str): directory to which the copies are written
+        profiles (list[str], optional): keys of
+            :py:data:`gdal_helpers.RASTER_PROFILES`. Defaults to None, which
+            benchmarks every profile.
+        window_size (int, optional): width and height of the read windows.
+            Defaults to 512.
+        n_windows (int, optional): number of windows read. Defaults to 200.
+
+    Returns:
+        pd.DataFrame: the timings and size of each profile
+    """
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    if profiles is None:
+        profiles = list(gdal_helpers.RASTER_PROFILES.keys())
+    source = gdal_helpers.read_dataset(raster_path)
+    raster_bounds = source.raster_bounds
+    strips = list(
+        raster_chunks.get_raster_chunks(
+            raster_bounds.x_size,
+            raster_bounds.y_size,
+            raster_bounds.x_size,
+            max(1, 2**22 // raster_bounds.x_size),
+        )
+    )
+    windows = _get_windows(raster_bounds, window_size, n_windows)
+    results = []
+    for name in profiles:
+        out_path = os.path.join(work_dir, f"{name}.tiff")
+        start = time.perf_counter()
+        with gdal_helpers.create_rasters(
+            raster_path,
+            [out_path],
+            driver_name="GTiff",
+            options=gdal_helpers.get_default_geotiff_creation_options(
+                source.data.dtype, name
+            ),
+        ) as out_datasets:
+            for strip in strips:
+                gdal_helpers.write_dataset_output(
+                    out_datasets[out_path],
+                    source.data[
+                        slice(strip.y_off, strip.y_off + strip.y_size), :
+                    ],
+                    x_off=0,
+                    y_off=strip.y_off,
+                )
+        write_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        gdal_helpers.build_overviews(out_path, name)
+        overview_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        gdal_helpers.read_dataset(out_path)
+        read_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # the raster is opened once, as by a tiling process
+        with gdal_helpers.raster_session():
+            for window in windows:
+                gdal_helpers.read_dataset(out_path, window)
+        window_read_seconds = time.perf_counter() - start
+
+        results.append(
+            [
+                name,
+                write_seconds,
+                overview_seconds,
+                _get_file_size(out_path) / 2**20,
+                read_seconds,
+                window_read_seconds,
+            ]
+        )
+    return pd.DataFrame(
+        columns=[
+            "profile",
+            "write_seconds",
+            "overview_seconds",
+            "size_mb",
+            "read_seconds",
+            "window_read_seconds",
+        ],
+        data=results,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare the write time, size and read time of the raster "
+            "output profiles"
+        )
+    )
+    parser.add_argument(
+        "--raster_path", help="path to the benchmarked raster", required=True
+    )
+    parser.add_argument(
+        "--work_dir",
+        help="directory to which the benchmark rasters are written",
+        required=True,
+    )
+    parser.add_argument(
+        "--profiles",
+        help="the profiles to compare, by default all profiles",
+        nargs="+",
+        choices=list(gdal_helpers.RASTER_PROFILES.keys()),
+        required=False,
+    )
+    parser.add_argument(
+        "--window_size", help="read window size", type=int, default=512
+    )
+    parser.add_argument(
+        "--n_windows", help="number of windows read", type=int, default=200
+    )
+    args = parser.parse_args(sys.argv[1:])
+    print(
+        benchmark_profiles(
+            args.raster_path,
+            args.work_dir,
+            args.profiles,
+            args.window_size,
+            args.n_windows,
+        ).to_string(index=False)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,113 @@
 import os
 import enum
+import shutil
+import threading
+from typing import Iterable
+from typing import Iterator
+from typing import Tuple
 from typing import Union
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute
+import pyarrow.csv
+import pyarrow.dataset
+import pyarrow.parquet as pq
 import sqlite3
+import sqlalchemy
+from sqlalchemy.engine import Engine
 from sqlalchemy.engine.url import URL
 from osgeo import gdal
-import subprocess
 from nifd_casfri_preprocessing import log_helper
 from nifd_casfri_preprocessing import sql
+from nifd_casfri_preprocessing import stage_cache
+from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
+from nifd_casfri_preprocessing.gis_helpers import rasterize
+from nifd_casfri_preprocessing.gis_helpers import reproject
 
 logger = log_helper.get_logger()
 
 
+# arrow types for postgres column type oids, used to give streamed tables a
+# schema that does not depend on the values in any one batch.  Unlisted
+# types are converted to strings.
+_PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int64(),
+    23: pa.int64(),
+    26: pa.int64(),
+    700: pa.float64(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    19: pa.string(),
+    25: pa.string(),
+    1042: pa.string(),
+    1043: pa.string(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+
+# sqlite settings used while writing a geopackage: a failed extraction is
+# re-run, so the rollback journal and fsync are not needed
+_GPKG_CONFIG_OPTIONS = {
+    "OGR_SQLITE_JOURNAL": "OFF",
+    "OGR_SQLITE_SYNCHRONOUS": "OFF",
+    "OGR_SQLITE_CACHE": "512",
+    "OGR_SQLITE_PRAGMA": "page_size=65536",
+}
+
+PARQUET_TABLE_NAMES = ["hdr", "cas", "eco", "lyr", "nfl", "dst", "geo_lookup"]
+
+# tables that define the layer column are partitioned on it when the
+# partitioned layout is used
+PARTITION_COLUMN = "layer"
+DEFAULT_ROW_GROUP_SIZE = 100000
+
+# low cardinality casfri code columns, stored dictionary encoded and loaded
+# as pandas categoricals
+CATEGORICAL_COLUMNS = set(
+    [
+        "inventory_id",
+        "stand_structure",
+        "soil_moist_reg",
+        "productivity_type",
+        "site_class",
+        "wetland_type",
+        "wet_veg_cover",
+        "wet_landform_mod",
+        "wet_local_mod",
+        "eco_site",
+        "nat_non_veg",
+        "non_for_anth",
+        "non_for_veg",
+    ]
+    + [f"species_{x}" for x in range(1, 11)]
+    + [f"dist_type_{x}" for x in range(1, 4)]
+)
+
+# integer casfri columns holding years, percentages, counts or the
+# negative casfri error codes, and the narrow type used to store them
+INTEGER_COLUMN_TYPES = dict(
+    [
+        ("raster_id", pa.int32()),
+        ("layer", pa.int16()),
+        ("num_of_layers", pa.int16()),
+        ("stand_photo_year", pa.int16()),
+        ("structure_per", pa.int16()),
+        ("crown_closure_upper", pa.int16()),
+        ("crown_closure_lower", pa.int16()),
+        ("origin_upper", pa.int16()),
+        ("origin_lower", pa.int16()),
+    ]
+    + [(f"species_per_{x}", pa.int16()) for x in range(1, 11)]
+    + [(f"dist_year_{x}", pa.int16()) for x in range(1, 4)]
+    + [(f"dist_ext_upper_{x}", pa.int16()) for x in range(1, 4)]
+    + [(f"dist_ext_lower_{x}", pa.int16()) for x in range(1, 4)]
+)
+
+
 class DatabaseType(enum.Enum):
     casfri_postgres = 0
     geopackage = 1
@@ -38,6 +134,23 @@ def get_sqlachemy_url(
     return url
 
 
+def create_engine(url: str, max_connections: int = 1) -> Engine:
+    """Create a sqlalchemy engine whose connection pool is shared by all
+    queries of an extraction
+
+    Args:
+        url (str): sqlalchemy connection url
+        max_connections (int, optional): the maximum number of pooled
+            connections. Defaults to 1.
+
+    Returns:
+        Engine: the sqlalchemy engine
+    """
+    return sqlalchemy.create_engine(
+        url, pool_size=max_connections, max_overflow=0
+    )
+
+
 def get_gdal_pg_connection_info(
     username: str, password: str, host: str, port: str, database: str
 ) -> str:
@@ -47,6 +160,65 @@ def get_gdal_pg_connection_info(
     )
 
 
+def get_inventory_ids(url: str) -> list[str]:
+    """Get all inventory ids defined in the casfri database hdr_all table
+
+    Args:
+        url (str): sqlalchemy connection url to the casfri database
+
+    Returns:
+        list[str]: the sorted inventory ids
+    """
+    query = sql.get_query("inventory_ids")
+    logger.info(f"query: {query}")
+    return list(pd.read_sql(query, url)["inventory_id"])
+
+
+def get_database_state(url: str) -> Union[dict[str, list[int]], None]:
+    """Get the modification counters and storage file nodes of the casfri
+    tables, as resolved by the extraction queries.  A change in the
+    returned value indicates that the tables may have changed since a
+    previous extraction.
+
+    The counters are a heuristic rather than an exact change detector: they
+    are reported by the statistics collector with a short delay, and
+    pg_stat_reset zeroes them, which is only detected if the table had been
+    modified before.  TRUNCATE is not counted, but assigns a new file node.
+    Pass use_cache=False to force an extraction when in doubt.
+
+    Args:
+        url (str): sqlalchemy connection url to the casfri database
+
+    Returns:
+        dict[str, list[int]], None: the number of modified rows and the file
+            node by schema qualified table name, or None if the state of
+            any of the tables could not be read, for example because it is
+            a view
+    """
+    query = sql.get_query("table_modifications")
+    try:
+        df = pd.read_sql(query, url)
+    except Exception:
+        logger.exception("failed to read table modification counters")
+        return None
+    missing = set(f"{name}_all" for name in sql.NAMES).difference(
+        df["relname"]
+    )
+    if missing:
+        logger.warning(
+            f"no modification counters for {sorted(missing)}, the cache "
+            "is disabled"
+        )
+        return None
+    return {
+        f"{row.schemaname}.{row.relname}": [
+            int(row.n_modified),
+            int(row.filenode),
+        ]
+        for row in df.itertuples(index=False)
+    }
+
+
 def _vacuum_sqlite(path: str) -> None:
     conn = sqlite3.connect(path)
     conn.execute("VACUUM")
@@ -62,33 +234,58 @@ def extract_to_geopackage(
     output_dir: str,
     inventory_id: str,
 ) -> None:
+    """Extract the tables of an inventory to a geopackage in process, using
+    a single source connection.  Each table is written in one transaction,
+    spatial indexes are built after all rows are written, and the file is
+    vacuumed once at the end.
+    """
     output_path = os.path.join(output_dir, f"casfri_{inventory_id}.gpkg")
     if os.path.exists(output_path):
         os.unlink(output_path)
     connection_str = get_gdal_pg_connection_info(
         username, password, host, port, database
     )
-    for idx, name in enumerate(sql.NAMES):
-
-        args = [
-            "ogr2ogr",
-            "-f",
-            "GPKG",
-            output_path,
-            connection_str,
-            "-nln",
-            name,
-            "-sql",
-            sql.get_inventory_id_fitered_query(name, inventory_id),
-        ]
-        if idx == 0:
-            args.append("-overwrite")
-        else:
-            args.append("-update")
-        logger.info(f"calling: {args}")
-        subprocess.check_call(args)
-        logger.info("running sqlite vacuum")
-        _vacuum_sqlite(output_path)
+    with gdal_helpers.gdal_config_options(_GPKG_CONFIG_OPTIONS):
+        source = gdal.OpenEx(connection_str, gdal.OF_VECTOR)
+        if not source:
+            raise ValueError("failed to connect to the casfri database")
+        destination = gdal.GetDriverByName("GPKG").Create(
+            output_path, 0, 0, 0, gdal.GDT_Unknown
+        )
+        try:
+            for name in sql.NAMES:
+                logger.info(f"translating {name}")
+                result = gdal.VectorTranslate(
+                    destination,
+                    source,
+                    options=gdal.VectorTranslateOptions(
+                        options=["-gt", "unlimited"],
+                        SQLStatement=sql.get_inventory_id_fitered_query(
+                            name, inventory_id
+                        ),
+                        layerName=name,
+                        layerCreationOptions=["SPATIAL_INDEX=NO"],
+                    ),
+                )
+                if not result:
+                    raise ValueError(f"failed to translate {name}")
+            for name in sql.NAMES:
+                geometry_column = destination.GetLayerByName(
+                    name
+                ).GetGeometryColumn()
+                if geometry_column:
+                    logger.info(f"creating {name} spatial index")
+                    destination.ReleaseResultSet(
+                        destination.ExecuteSQL(
+                            f"SELECT CreateSpatialIndex('{name}', "
+                            f"'{geometry_column}')"
+                        )
+                    )
+        finally:
+            destination = None
+            source = None
+    logger.info("running sqlite vacuum")
+    _vacuum_sqlite(output_path)
 
 
 def extract_to_parquet_with_raster(
@@ -100,56 +297,641 @@ def extract_to_parquet_with_raster(
     output_dir: str,
     inventory_id: str,
     resolution: float,
+    use_cache: bool = True,
+    max_connections: int = 1,
+    batch_size: int = None,
+    partitioned: bool = False,
+    use_copy: bool = True,
+    rasterize_workers: int = None,
+    raster_profile: str = None,
+    wgs84: bool = False,
 ) -> None:
     url = str(
         get_sqlachemy_url(
             "postgresql", username, password, host, port, database
         )
     )
-    _extract_parquet(output_dir, inventory_id, url)
-    raster_path = os.path.join(output_dir, "cas_id.tiff")
+    manifest = stage_cache.StageManifest(output_dir)
+    database_state = get_database_state(url) if use_cache else None
+
+    def is_current(stage: str, stage_fingerprint: str) -> bool:
+        if database_state is None:
+            return False
+        if manifest.is_current(stage, stage_fingerprint):
+            logger.info(f"{stage} is up to date, skipping")
+            return True
+        return False
 
-    logger.info("calling gdal.Rasterize")
-    gdal.Rasterize(
-        destNameOrDestDS=os.path.join(output_dir, "cas_id.tiff"),
-        srcDS=get_gdal_pg_connection_info(
+    parquet_fingerprint = stage_cache.fingerprint(
+        dict(
+            inventory_id=inventory_id,
+            database_state=database_state,
+            partitioned=partitioned,
+            version=stage_cache.get_package_version(),
+        )
+    )
+    if not is_current("parquet", parquet_fingerprint):
+        manifest.invalidate("parquet")
+        _extract_parquet(
+            output_dir,
+            inventory_id,
+            url,
+            max_connections,
+            batch_size,
+            partitioned,
+            use_copy,
+        )
+        manifest.record(
+            "parquet",
+            parquet_fingerprint,
+            [get_table_path(output_dir, name) for name in PARQUET_TABLE_NAMES],
+        )
+
+    raster_path = os.path.join(output_dir, "cas_id.tiff")
+    profile = gdal_helpers.get_raster_profile(raster_profile)
+    creation_options = profile.get_creation_options()
+    raster_fingerprint = stage_cache.fingerprint(
+        dict(
+            parquet=parquet_fingerprint,
+            resolution=float(resolution),
+            raster_profile=vars(profile),
+        )
+    )
+    if not is_current("raster", raster_fingerprint):
+        manifest.invalidate("raster")
+        pg_connection_info = get_gdal_pg_connection_info(
             username, password, host, port, database
-        ),
-        options=gdal.RasterizeOptions(
-            SQLStatement=sql.get_inventory_id_fitered_query(
-                "gdal_rasterization", inventory_id
-            ),
-            attribute="raster_id",
-            xRes=resolution,
-            yRes=resolution,
-            creationOptions=["BIGTIFF=YES", "COMPRESS=DEFLATE"],
-            noData=-1,
-            outputType=gdal.GDT_Int32,
-        ),
+        )
+        if rasterize_workers and rasterize_workers > 1:
+            logger.info(f"rasterizing tiles with {rasterize_workers} workers")
+            # the raster ids are numbered once by the geo_lookup query of
+            # the parquet stage, so the tile queries only select by extent
+            geo_lookup = read_table(
+                output_dir, "geo_lookup", ["cas_id", "raster_id"]
+            )
+            rasterize.rasterize_tiled(
+                source=pg_connection_info,
+                extent_sql_statement=sql.get_inventory_id_fitered_query(
+                    "gdal_rasterization_extent", inventory_id
+                ),
+                tile_sql_template=sql.get_inventory_id_fitered_query(
+                    "gdal_rasterization_tile", inventory_id
+                ),
+                dest_path=raster_path,
+                key_field="cas_id",
+                key_values=pd.Series(
+                    geo_lookup["raster_id"].to_numpy(),
+                    index=geo_lookup["cas_id"].astype(str),
+                ),
+                resolution=float(resolution),
+                nodata=-1,
+                data_type=gdal.GDT_Int32,
+                # tiles are written out of order, so whole blocks of a
+                # tiled output are written at a time
+                creation_options=(
+                    creation_options
+                    if profile.tiled
+                    else creation_options + ["TILED=YES"]
+                ),
+                workers=rasterize_workers,
+            )
+        else:
+            logger.info("calling gdal.Rasterize")
+            gdal.Rasterize(
+                destNameOrDestDS=raster_path,
+                srcDS=pg_connection_info,
+                options=gdal.RasterizeOptions(
+                    SQLStatement=sql.get_inventory_id_fitered_query(
+                        "gdal_rasterization", inventory_id
+                    ),
+                    attribute="raster_id",
+                    xRes=resolution,
+                    yRes=resolution,
+                    creationOptions=creation_options,
+                    noData=-1,
+                    outputType=gdal.GDT_Int32,
+                ),
+            )
+        gdal_helpers.build_overviews(raster_path, profile)
+        manifest.record("raster", raster_fingerprint, [raster_path])
+
+    if wgs84:
+        create_wgs84_raster(
+            output_dir, raster_profile=raster_profile, use_cache=use_cache
+        )
+
+
+def create_wgs84_raster(
+    data_dir: str,
+    resolution: float = None,
+    align_origin: Tuple[float, float] = None,
+    warp_memory_mb: int = 512,
+    raster_profile: str = None,
+    use_cache: bool = True,
+) -> str:
+    """Create the wgs84 version of the cas_id raster of an extracted
+    inventory, if it does not exist or was created from different inputs.
+
+    Args:
+        data_dir (str): directory containing an extracted parquet dataset
+        resolution (float, optional): the output resolution in degrees.
+            Defaults to None, which uses the resolution suggested by gdal.
+        align_origin (Tuple[float, float], optional): a coordinate to
+            which output pixel edges are snapped, see
+            :py:func:`reproject.get_warp_grid`. Defaults to None.
+        warp_memory_mb (int, optional): the warp working buffer size.
+            Defaults to 512.
+        raster_profile (str, optional): the output raster profile, see
+            :py:func:`gdal_helpers.get_raster_profile`. Defaults to None.
+        use_cache (bool, optional): if set the raster is not re-created
+            when its inputs are unchanged. Defaults to True.
+
+    Returns:
+        str: the path to the wgs84 raster
+    """
+    raster_path = os.path.join(data_dir, "cas_id.tiff")
+    wgs84_raster_path = os.path.join(data_dir, "cas_id_wgs84.tiff")
+    manifest = stage_cache.StageManifest(data_dir)
+    profile = gdal_helpers.get_raster_profile(raster_profile)
+    wgs84_fingerprint = None
+    if use_cache:
+        wgs84_fingerprint = stage_cache.fingerprint(
+            dict(
+                raster=stage_cache.input_fingerprint(
+                    raster_path, manifest, "raster"
+                ),
+                resolution=resolution,
+                align_origin=align_origin,
+                raster_profile=vars(profile),
+            )
+        )
+        if manifest.is_current("raster_wgs84", wgs84_fingerprint):
+            logger.info("raster_wgs84 is up to date, skipping")
+            return wgs84_raster_path
+    manifest.invalidate("raster_wgs84")
+    logger.info("warping cas_id raster to wgs84")
+    reproject.warp(
+        raster_path,
+        wgs84_raster_path,
+        resolution=resolution,
+        align_origin=align_origin,
+        warp_memory_mb=warp_memory_mb,
+        creation_options=profile.get_creation_options(),
+    )
+    gdal_helpers.build_overviews(wgs84_raster_path, profile)
+    if use_cache:
+        manifest.record("raster_wgs84", wgs84_fingerprint, [wgs84_raster_path])
+    return wgs84_raster_path
+
+
+def _extract_parquet(
+    output_dir,
+    inventory_id,
+    url,
+    max_connections=1,
+    batch_size=None,
+    partitioned=False,
+    use_copy=True,
+):
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    queries = _get_queries(DatabaseType.casfri_postgres, inventory_id)
+    queries["geo_lookup"] = sql.get_inventory_id_fitered_query(
+        "gdal_rasterization_lookup", inventory_id
     )
+    if partitioned:
+        # sorted cas_id gives each row group a narrow cas_id min/max range
+        queries = {
+            name: (
+                query
+                if name == "hdr"
+                else f"SELECT * FROM ({query}) AS q ORDER BY cas_id"
+            )
+            for name, query in queries.items()
+        }
+    engine = create_engine(url, max_connections)
+    try:
+        _run_concurrently(
+            lambda name: _extract_table(
+                engine,
+                queries[name],
+                os.path.join(output_dir, name),
+                batch_size,
+                partitioned,
+                use_copy,
+            ),
+            list(queries.keys()),
+            max_connections,
+        )
+    finally:
+        engine.dispose()
+
+
+def _extract_table(
+    engine: Engine,
+    query: str,
+    path_without_ext: str,
+    batch_size: int = None,
+    partitioned: bool = False,
+    use_copy: bool = True,
+) -> None:
+    if use_copy and engine.dialect.name == "postgresql":
+        schema = get_query_schema(engine, query)
+        compact_schema = get_compact_schema(schema)
+        batches = (
+            batch.cast(compact_schema)
+            for batch in read_copy_batches(engine, query, schema=schema)
+        )
+        if batch_size:
+            _write_table(
+                _rebatch(batches, compact_schema, batch_size),
+                path_without_ext,
+                partitioned,
+                schema=compact_schema,
+                row_group_size=batch_size,
+            )
+        else:
+            _write_table(
+                pa.Table.from_batches(batches, schema=compact_schema),
+                path_without_ext,
+                partitioned,
+            )
+        return
+    if batch_size:
+        _stream_table(engine, query, path_without_ext, batch_size, partitioned)
+        return
+    df = _read_sql(engine, query)
+    _write_table(_to_compact_table(df), path_without_ext, partitioned)
+
+
+def get_query_schema(engine: Engine, query: str) -> pa.Schema:
+    """Get the arrow schema of the result of a query from the column types
+    reported by the database driver, without fetching any rows.
+
+    Args:
+        engine (Engine): the sqlalchemy engine
+        query (str): the query
+
+    Returns:
+        pa.Schema: the result schema
+    """
+    with engine.connect() as connection:
+        result = connection.exec_driver_sql(
+            f"SELECT * FROM ({query}) AS q LIMIT 0"
+        )
+        return _get_arrow_schema(
+            list(result.keys()), result.cursor.description
+        )
+
+
+def read_copy_batches(
+    engine: Engine,
+    query: str,
+    block_size: int = 2**24,
+    schema: pa.Schema = None,
+) -> Iterator[pa.RecordBatch]:
+    """Read the result of a query with ``COPY ... TO STDOUT`` in csv format
+    and parse it into arrow record batches with the multithreaded arrow csv
+    reader, without creating a python object per value.  The copy runs on a
+    separate thread writing to a pipe, so that at most a few blocks of csv
+    are held in memory.  Requires a psycopg2 postgresql engine.
+
+    Args:
+        engine (Engine): the sqlalchemy engine
+        query (str): the query
+        block_size (int, optional): the number of bytes of csv parsed into
+            each batch. Defaults to 16MiB.
+        schema (pa.Schema, optional): the result schema, if already known.
+            Defaults to None, which queries it with
+            :py:func:`get_query_schema`.
+
+    Raises:
+        Exception: the copy failed
+
+    Yields:
+        Iterator[pa.RecordBatch]: the result batches, typed as by
+            :py:func:`get_query_schema`
+    """
+    if schema is None:
+        schema = get_query_schema(engine, query)
+    logger.info(f"copy query: {query}")
+    read_fd, write_fd = os.pipe()
+    errors = []
 
-    # also create a wgs84 version of the raster
-    wgs84_raster_path = os.path.join(output_dir, "cas_id_wgs84.tiff")
-    logger.info("calling gdal.Warp")
-    gdal.Warp(
-        destNameOrDestDS=wgs84_raster_path,
-        srcDSOrSrcDSTab=raster_path,
-        options=gdal.WarpOptions(
-            dstSRS="+proj=longlat +ellps=WGS84",
-            creationOptions=["BIGTIFF=YES", "COMPRESS=DEFLATE"],
-            outputType=gdal.GDT_Int32,
+    def copy():
+        try:
+            with os.fdopen(write_fd, "wb") as writer:
+                connection = engine.raw_connection()
+                try:
+                    cursor = connection.cursor()
+                    cursor.copy_expert(
+                        f"COPY ({query}) TO STDOUT "
+                        "WITH (FORMAT csv, HEADER true)",
+                        writer,
+                    )
+                    cursor.close()
+                finally:
+                    connection.close()
+        except Exception as ex:
+            errors.append(ex)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+    try:
+        try:
+            with os.fdopen(read_fd, "rb") as reader:
+                csv_reader = pyarrow.csv.open_csv(
+                    reader,
+                    read_options=pyarrow.csv.ReadOptions(
+                        block_size=block_size
+                    ),
+                    # quoted text values may contain line breaks
+                    parse_options=pyarrow.csv.ParseOptions(
+                        newlines_in_values=True
+                    ),
+                    convert_options=pyarrow.csv.ConvertOptions(
+                        column_types={
+                            field.name: field.type for field in schema
+                        },
+                        # postgres writes NULL unquoted and empty strings
+                        # quoted
+                        null_values=[""],
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                        true_values=["t"],
+                        false_values=["f"],
+                    ),
+                )
+                for batch in csv_reader:
+                    yield batch.select(schema.names)
+        finally:
+            # closing the pipe above stops a copy that is still writing, for
+            # example when the batches are not all consumed
+            thread.join()
+    except Exception as ex:
+        # once the pipe is closed the copy fails with a broken pipe, so a
+        # copy error is only the cause of a read error
+        if errors:
+            raise ex from errors[0]
+        raise
+    if errors:
+        raise errors[0]
+
+
+def _rebatch(
+    batches: Iterable[pa.RecordBatch], schema: pa.Schema, batch_size: int
+) -> Iterator[pa.RecordBatch]:
+    """Combine or split record batches into batches of batch_size rows"""
+    pending = schema.empty_table()
+    for batch in batches:
+        pending = pa.concat_tables(
+            [pending, pa.Table.from_batches([batch], schema=schema)]
+        )
+        while pending.num_rows >= batch_size:
+            yield from pending.slice(
+                0, batch_size
+            ).combine_chunks().to_batches()
+            pending = pending.slice(batch_size)
+    if pending.num_rows:
+        yield from pending.combine_chunks().to_batches()
+
+
+def _remove_table(path_without_ext: str) -> None:
+    if os.path.isdir(path_without_ext):
+        shutil.rmtree(path_without_ext)
+    if os.path.exists(f"{path_without_ext}.parquet"):
+        os.unlink(f"{path_without_ext}.parquet")
+
+
+def _get_partitioning() -> pyarrow.dataset.Partitioning:
+    return pyarrow.dataset.partitioning(
+        pa.schema(
+            [
+                pa.field(
+                    PARTITION_COLUMN, INTEGER_COLUMN_TYPES[PARTITION_COLUMN]
+                )
+            ]
         ),
+        flavor="hive",
     )
 
 
-def _extract_parquet(output_dir, inventory_id, url):
-    data = load_data(url, DatabaseType.casfri_postgres, inventory_id)
-    geo_lookup_query = sql.get_inventory_id_fitered_query(
-        "gdal_rasterization_lookup", inventory_id
+def _write_table(
+    data: Union[pa.Table, Iterable[pa.RecordBatch]],
+    path_without_ext: str,
+    partitioned: bool,
+    schema: pa.Schema = None,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> None:
+    """Write a table, or a sequence of record batches, as a single parquet
+    file at ``<path_without_ext>.parquet``, or if partitioned is set and the
+    table has a layer column, as a hive partitioned dataset in the
+    directory ``<path_without_ext>/layer=<layer>/``.  Row group min/max
+    statistics are written in both cases.
+    """
+    _remove_table(path_without_ext)
+    if schema is None:
+        schema = data.schema
+    if partitioned and isinstance(data, pa.Table) and "cas_id" in schema.names:
+        # cas_id may be dictionary encoded, which is not sortable directly
+        data = data.take(
+            pyarrow.compute.sort_indices(data["cas_id"].cast(pa.string()))
+        )
+    if partitioned and PARTITION_COLUMN in schema.names:
+        logger.info(f"writing {path_without_ext}")
+        pyarrow.dataset.write_dataset(
+            data,
+            path_without_ext,
+            schema=schema,
+            format="parquet",
+            partitioning=_get_partitioning(),
+            max_rows_per_group=row_group_size,
+            min_rows_per_group=row_group_size,
+        )
+        return
+    path = f"{path_without_ext}.parquet"
+    logger.info(f"writing {path}")
+    with pq.ParquetWriter(path, schema) as writer:
+        if isinstance(data, pa.Table):
+            writer.write_table(data, row_group_size=row_group_size)
+            return
+        empty = True
+        for batch in data:
+            writer.write_batch(batch)
+            empty = False
+        if empty:
+            writer.write_table(schema.empty_table())
+
+
+def _get_arrow_schema(names: list[str], description) -> pa.Schema:
+    fields = []
+    for idx, name in enumerate(names):
+        type_code = description[idx][1] if description else None
+        fields.append(
+            pa.field(name, _PG_ARROW_TYPES.get(type_code, pa.string()))
+        )
+    return pa.schema(fields)
+
+
+def _to_arrow_array(values: tuple, arrow_type: pa.DataType) -> pa.Array:
+    if pa.types.is_floating(arrow_type):
+        values = [None if v is None else float(v) for v in values]
+    elif pa.types.is_string(arrow_type):
+        values = [None if v is None else str(v) for v in values]
+    return pa.array(values, type=arrow_type)
+
+
+def get_compact_schema(schema: pa.Schema) -> pa.Schema:
+    """Get the storage schema for an extracted table: casfri code columns
+    are dictionary encoded, and integer code columns are narrowed.
+
+    Args:
+        schema (pa.Schema): the schema of the table as queried
+
+    Returns:
+        pa.Schema: the schema with the compact column types
+    """
+    fields = []
+    for field in schema:
+        if field.name in CATEGORICAL_COLUMNS and pa.types.is_string(
+            field.type
+        ):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif field.name in INTEGER_COLUMN_TYPES and (
+            pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        ):
+            field = field.with_type(INTEGER_COLUMN_TYPES[field.name])
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def _to_compact_table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.cast(get_compact_schema(table.schema))
+
+
+def _stream_table(
+    engine: Engine,
+    query: str,
+    path_without_ext: str,
+    batch_size: int,
+    partitioned: bool = False,
+) -> None:
+    """Read a query through a server-side cursor in batches of batch_size
+    rows and append each batch to parquet, so that at most one batch is
+    held in memory.
+    """
+    logger.info(f"query: {query}")
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=batch_size
+        ).exec_driver_sql(query)
+        # sqlalchemy pre-fetches from server-side cursors so the column
+        # description is available before the first batch is read
+        schema = _get_arrow_schema(
+            list(result.keys()), result.cursor.description
+        )
+        compact_schema = get_compact_schema(schema)
+
+        def iter_batches() -> Iterable[pa.RecordBatch]:
+            rows = result.fetchmany(batch_size)
+            while rows:
+                columns = list(zip(*rows))
+                batch = pa.RecordBatch.from_arrays(
+                    [
+                        _to_arrow_array(column, field.type)
+                        for column, field in zip(columns, schema)
+                    ],
+                    schema=schema,
+                )
+                yield batch.cast(compact_schema)
+                rows = result.fetchmany(batch_size)
+
+        _write_table(
+            iter_batches(),
+            path_without_ext,
+            partitioned,
+            schema=compact_schema,
+            row_group_size=batch_size,
+        )
+
+
+def _read_sql(engine: Engine, query: str) -> pd.DataFrame:
+    logger.info(f"query: {query}")
+    with engine.connect() as connection:
+        return pd.read_sql(query, connection)
+
+
+def read_arrow(engine: Engine, query: str) -> pa.Table:
+    """Read the result of a query as an arrow table typed by the column
+    types reported by the database driver.
+
+    Args:
+        engine (Engine): the sqlalchemy engine
+        query (str): the query
+
+    Returns:
+        pa.Table: the query result
+    """
+    logger.info(f"query: {query}")
+    with engine.connect() as connection:
+        result = connection.exec_driver_sql(query)
+        schema = _get_arrow_schema(
+            list(result.keys()), result.cursor.description
+        )
+        rows = result.fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    return pa.Table.from_arrays(
+        [
+            _to_arrow_array(column, field.type)
+            for column, field in zip(columns, schema)
+        ],
+        schema=schema,
     )
-    logger.info(f"query: {geo_lookup_query}")
-    data["geo_lookup"] = pd.read_sql(geo_lookup_query, url)
-    save_raw_tables(data, output_dir)
+
+
+def read_arrow_tables(
+    url: str, queries: dict[str, str], max_connections: int = 1
+) -> dict[str, pa.Table]:
+    """Run the specified queries concurrently on a pooled engine and return
+    the results as arrow tables.
+
+    Args:
+        url (str): sqlalchemy connection url
+        queries (dict[str, str]): the queries by name
+        max_connections (int, optional): the maximum number of concurrent
+            queries. Defaults to 1.
+
+    Returns:
+        dict[str, pa.Table]: the query results by name
+    """
+    engine = create_engine(url, max_connections)
+    try:
+        return _run_concurrently(
+            lambda name: read_arrow(engine, queries[name]),
+            list(queries.keys()),
+            max_connections,
+        )
+    finally:
+        engine.dispose()
+
+
+def _run_concurrently(func, names: list[str], max_workers: int) -> dict:
+    """call func for each name on a pool of at most max_workers threads and
+    return the results by name. Exceptions are re-raised."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(func, name) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _get_queries(
+    database_type: Union[int, DatabaseType], inventory_id: str
+) -> dict[str, str]:
+    return {
+        name: _sql_func(name, database_type, inventory_id)
+        for name in sql.NAMES
+        if name != "geo"
+    }
 
 
 def _sql_func(
@@ -167,29 +949,157 @@ def load_data(
     url: str,
     database_type: Union[int, DatabaseType],
     inventory_id: str,
+    max_connections: int = 1,
 ) -> dict[str, pd.DataFrame]:
-    data = {}
-    for name in sql.NAMES:
-        if name == "geo":
-            continue
-        query = _sql_func(name, database_type, inventory_id)
-        logger.info(f"query: {query}")
-        data[name] = pd.read_sql(query, url)
+    queries = _get_queries(database_type, inventory_id)
+    engine = create_engine(url, max_connections)
+    try:
+        return _run_concurrently(
+            lambda name: _read_sql(engine, queries[name]),
+            list(queries.keys()),
+            max_connections,
+        )
+    finally:
+        engine.dispose()
 
-    return data
+
+def get_table_path(data_dir: str, table: str) -> str:
+    """Get the path to an extracted table: a directory if the table was
+    written in the partitioned layout, otherwise a parquet file.
+    """
+    partitioned_path = os.path.join(data_dir, table)
+    if os.path.isdir(partitioned_path):
+        return partitioned_path
+    return os.path.join(data_dir, f"{table}.parquet")
 
 
 def load_parquet(data_dir: str) -> dict[str, pd.DataFrame]:
+    """Load the extracted parquet tables.  casfri code columns are loaded
+    as categoricals and cas_id is interned as a categorical shared by all
+    tables, so that joins and groupbys on these columns operate on integer
+    codes.
+
+    Args:
+        data_dir (str): directory containing the extracted parquet tables
+
+    Returns:
+        dict[str, pd.DataFrame]: the tables by name
+    """
     data = {}
-    for table in ["hdr", "cas", "eco", "lyr", "nfl", "dst", "geo_lookup"]:
-        data[table] = pd.read_parquet(
-            os.path.join(data_dir, f"{table}.parquet")
-        )
+    for table in PARQUET_TABLE_NAMES:
+        data[table] = read_table(data_dir, table)
+    intern_cas_ids(data)
     return data
 
 
-def save_raw_tables(data: dict[str, pd.DataFrame], output_dir: str):
+def read_table(
+    data_dir: str,
+    table: str,
+    columns: list[str] = None,
+    filters: list[tuple] = None,
+    cas_id_dtype: pd.CategoricalDtype = None,
+) -> pd.DataFrame:
+    """Read the specified columns and rows of an extracted parquet table.
+    The column projection and row filters are pushed down to the parquet
+    reader so that only the requested data is read and decoded. For tables
+    in the partitioned layout, filters on layer read only the matching
+    partitions, and filters on cas_id skip row groups using their min/max
+    statistics.
+
+    Args:
+        data_dir (str): directory containing the extracted parquet tables
+        table (str): the table name, for example "lyr"
+        columns (list[str], optional): the columns to read. If not
+            specified all columns are read.
+        filters (list[tuple], optional): row filters in the
+            ``pyarrow.parquet`` (column, op, value) form, for example
+            ``[("layer", "==", 1)]``. Defaults to None.
+        cas_id_dtype (pd.CategoricalDtype, optional): if specified, the
+            cas_id column is converted to this dtype. See
+            :py:func:`get_cas_id_dtype`
+
+    Returns:
+        pd.DataFrame: the table with code columns as categoricals
+    """
+    path = get_table_path(data_dir, table)
+    dataset = pyarrow.dataset.dataset(
+        path,
+        format="parquet",
+        partitioning=_get_partitioning() if os.path.isdir(path) else None,
+    )
+    arrow_table = dataset.to_table(
+        columns=columns,
+        filter=pq.filters_to_expression(filters) if filters else None,
+    )
+    df = _to_categoricals(arrow_table.to_pandas())
+    if cas_id_dtype is not None and "cas_id" in df.columns:
+        df["cas_id"] = df["cas_id"].astype(str).astype(cas_id_dtype)
+    return df
+
+
+def get_cas_id_dtype(data_dir: str) -> pd.CategoricalDtype:
+    """Get a categorical dtype for interning the cas_id column of any
+    extracted table.  The categories are taken from the cas table, which
+    every other table is joined to during extraction.
+
+    Args:
+        data_dir (str): directory containing the extracted parquet tables
+
+    Returns:
+        pd.CategoricalDtype: the cas_id dtype
+    """
+    cas_ids = read_table(data_dir, "cas", columns=["cas_id"])["cas_id"]
+    return pd.CategoricalDtype(
+        pd.Index(cas_ids.astype(str).unique()).sort_values()
+    )
+
+
+def _to_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    for col in df.columns:
+        if col not in CATEGORICAL_COLUMNS:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # dictionary encoded columns are decoded with their categories
+            # in order of first appearance, sort them so that ordering by a
+            # code column matches ordering by its values
+            df[col] = df[col].cat.reorder_categories(
+                df[col].cat.categories.sort_values()
+            )
+        elif pd.api.types.is_string_dtype(df[col].dtype):
+            # tables extracted by earlier versions store code columns as
+            # strings
+            df[col] = df[col].astype("category")
+    return df
+
+
+def intern_cas_ids(data: dict[str, pd.DataFrame]) -> None:
+    """Convert the cas_id column of every table to a categorical with the
+    same categories, so that each cas_id is stored once and referenced by
+    an integer code.
+
+    Args:
+        data (dict[str, pd.DataFrame]): tables by name, modified in place
+    """
+    tables = [df for df in data.values() if "cas_id" in df.columns]
+    if not tables:
+        return
+    categories = (
+        pd.Index([], dtype=str)
+        .append([pd.Index(df["cas_id"].astype(str).unique()) for df in tables])
+        .unique()
+        .sort_values()
+    )
+    dtype = pd.CategoricalDtype(categories)
+    for df in tables:
+        df["cas_id"] = df["cas_id"].astype(str).astype(dtype)
+
+
+def save_raw_tables(
+    data: dict[str, pd.DataFrame], output_dir: str, partitioned: bool = False
+):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     for k, v in data.items():
-        v.to_parquet(os.path.join(output_dir, f"{k}.parquet"), index=False)
+        _write_table(
+            _to_compact_table(v), os.path.join(output_dir, k), partitioned
+        )
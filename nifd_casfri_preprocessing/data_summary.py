@@ -1,13 +1,20 @@
 import os
+import tempfile
 
 from typing import Union
+import duckdb
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute
 from IPython.display import display
+from IPython.display import Image
 from IPython.display import Markdown
 
-import matplotlib.pyplot as plt
 from nifd_casfri_preprocessing import log_helper
 from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing import sql
+from nifd_casfri_preprocessing import summary_figures
 
 logger = log_helper.get_logger()
 _cas_analysis_cols = [
@@ -84,9 +91,122 @@ _dst_analysis_cols = [
     "dist_ext_lower_3",
 ]
 
+# the summarized tables, their analysis columns and whether they are
+# summarized by layer
+SUMMARY_TABLES: list[tuple[str, list[str], bool]] = [
+    ("cas", _cas_analysis_cols, False),
+    ("eco", _eco_analysis_cols, False),
+    ("lyr", _lyr_analysis_cols, True),
+    ("nfl", _nfl_analysis_cols, True),
+    ("dst", _dst_analysis_cols, True),
+]
 
-def _merge_area(df: pd.DataFrame, cas_df: pd.DataFrame) -> pd.DataFrame:
-    return df.merge(cas_df[["cas_id", "casfri_area"]])
+# a list of (layer, column, distribution) as returned by
+# get_area_distributions
+Distributions = list[tuple[Union[int, None], str, pd.DataFrame]]
+
+
+def _get_cas_positions(df: pd.DataFrame, cas: pd.DataFrame) -> np.ndarray:
+    """Get the position in the cas table of the cas_id of each row in df,
+    or -1 where the cas_id is not defined in cas.
+    """
+    return pd.Index(cas["cas_id"]).get_indexer(df["cas_id"])
+
+
+def _get_value_codes(values: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """Encode a column as integer codes into a sorted index of its distinct
+    values, with -1 for null values.  Categorical columns are recoded from
+    their existing codes rather than factorized.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        order = categories.argsort()
+        recode = np.empty(len(order), dtype="int64")
+        recode[order] = np.arange(len(order))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, recode[codes], -1), pd.Index(
+            categories.to_numpy()[order]
+        )
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def get_table_area(df: pd.DataFrame, cas: pd.DataFrame) -> float:
+    """Get the total casfri_area of the distinct cas_ids in the specified
+    table.
+
+    Args:
+        df (pd.DataFrame): a casfri table with a cas_id column
+        cas (pd.DataFrame): the cas table
+
+    Returns:
+        float: the area
+    """
+    positions = _get_cas_positions(df, cas)
+    present = np.zeros(len(cas.index), dtype=bool)
+    present[positions[positions >= 0]] = True
+    return np.nansum(cas["casfri_area"].to_numpy(dtype="float64")[present])
+
+
+def get_area_distributions(
+    df: pd.DataFrame,
+    cas: pd.DataFrame,
+    columns: list[str],
+    by_layer: bool,
+) -> Distributions:
+    """Compute the casfri_area summed by value of each of the specified
+    columns, and optionally by layer.  The area of each row is gathered from
+    the cas table by cas_id, and each column is reduced with a single
+    bincount keyed on (layer, value) rather than a groupby per layer.
+
+    Args:
+        df (pd.DataFrame): a casfri table
+        cas (pd.DataFrame): the cas table, which defines casfri_area
+        columns (list[str]): the columns to summarize
+        by_layer (bool): if set, the distributions are computed for each
+            value of the df layer column, in sorted order
+
+    Returns:
+        Distributions: a list of (layer, column, distribution) where layer
+            is None if by_layer is not set, and each distribution is indexed
+            by the distinct column values, sorted, with a single casfri_area
+            column
+    """
+    positions = _get_cas_positions(df, cas)
+    matched = positions >= 0
+    # position -1 gathers the appended zero area
+    weights = np.append(
+        np.nan_to_num(cas["casfri_area"].to_numpy(dtype="float64")), 0.0
+    )[positions]
+    if by_layer:
+        layer_codes, layer_ids = pd.factorize(df["layer"], sort=True)
+    else:
+        layer_codes, layer_ids = np.zeros(len(df.index), dtype=int), [None]
+    matched &= layer_codes >= 0
+    n_layers = len(layer_ids)
+    result = []
+    distributions = {}
+    for column in columns:
+        value_codes, values = _get_value_codes(df[column])
+        n_values = len(values)
+        valid = matched & (value_codes >= 0)
+        keys = layer_codes[valid] * n_values + value_codes[valid]
+        counts = np.bincount(keys, minlength=n_layers * n_values).reshape(
+            n_layers, n_values
+        )
+        areas = np.bincount(
+            keys, weights=weights[valid], minlength=n_layers * n_values
+        ).reshape(n_layers, n_values)
+        for i_layer in range(n_layers):
+            present = counts[i_layer] > 0
+            distributions[(i_layer, column)] = pd.DataFrame(
+                {"casfri_area": areas[i_layer][present]},
+                index=values[present].rename(column),
+            )
+    for i_layer, layer_id in enumerate(layer_ids):
+        for column in columns:
+            result.append((layer_id, column, distributions[(i_layer, column)]))
+    return result
 
 
 def clean_nulls(df: pd.DataFrame) -> tuple[pd.DataFrame, float]:
@@ -104,25 +224,42 @@ def clean_nulls(df: pd.DataFrame) -> tuple[pd.DataFrame, float]:
 
 
 class Summary:
-    def __init__(self, data: dict[str, pd.DataFrame]):
+    """Area distributions of the values of the analysis columns of each
+    casfri table, and of the extent of null or undefined values.
+
+    Args:
+        data (dict[str, pd.DataFrame]): the raw casfri tables by name.  Only
+            the hdr table is required if distributions and table_areas are
+            specified.
+        distributions (dict[str, Distributions], optional): precomputed
+            distributions by table name, for example aggregated by a
+            database. If not specified they are computed from data.
+        table_areas (dict[str, float], optional): precomputed total area of
+            each table. If not specified they are computed from data.
+    """
+
+    def __init__(
+        self,
+        data: dict[str, pd.DataFrame],
+        distributions: dict[str, Distributions] = None,
+        table_areas: dict[str, float] = None,
+    ):
         self._data = data
-        self._table_areas: dict[str, float] = self._compute_table_area_totals()
+        if table_areas is None:
+            table_areas = self._compute_table_area_totals()
+        self._table_areas: dict[str, float] = table_areas
         self._summary_data: dict[str, pd.DataFrame] = {}
         self._summary_data_cleaned: dict[str, pd.DataFrame] = {}
         self._null_summary: dict[str, float] = {}
         self._directory: dict[str, dict[Union[int, None], list[str]]] = {}
-        self._compile_summary()
+        self._compile_summary(distributions)
 
     def _compute_table_area_totals(self):
-        areas = {}
-        for table in ["cas", "eco", "lyr", "nfl", "dst"]:
-            raw_table = self._data[table]
-            areas[table] = (
-                raw_table[["cas_id", "casfri_area"]]
-                .drop_duplicates("cas_id")["casfri_area"]
-                .sum()
-            )
-        return areas
+        cas = self._data["cas"]
+        return {
+            table: get_table_area(self._data[table], cas)
+            for table, _, _ in SUMMARY_TABLES
+        }
 
     def insert(
         self, df: pd.DataFrame, table: str, column: str, layer_id: int = None
@@ -184,74 +321,18 @@ class Summary:
     def get_raw_table(self, name) -> pd.DataFrame:
         return self._data[name]
 
-    def _compile_summary(self):
-
-        cas = self._data["cas"]
-        eco = self._data["eco"]
-        lyr = self._data["lyr"]
-        nfl = self._data["nfl"]
-        dst = self._data["dst"]
-
+    def _compile_summary(self, distributions: dict[str, Distributions] = None):
         logger.info("compiling summaries")
-
-        logger.info("cas")
-
-        for cas_analysis_col in _cas_analysis_cols:
-
-            df = (
-                cas[[cas_analysis_col, "casfri_area"]]
-                .groupby(cas_analysis_col)
-                .sum()
-            )
-            self.insert(df, "cas", cas_analysis_col, None)
-
-        logger.info("eco")
-        for eco_analysis_col in _eco_analysis_cols:
-            df = (
-                eco[[eco_analysis_col, "casfri_area"]]
-                .groupby(eco_analysis_col)
-                .sum()
-            )
-            self.insert(df, "eco", eco_analysis_col, None)
-
-        logger.info("lyr")
-        lyr_layer_ids = list(lyr["layer"].unique())
-        for layer_id in lyr_layer_ids:
-            for lyr_analysis_col in _lyr_analysis_cols:
-                df = (
-                    lyr.loc[lyr.layer == layer_id][
-                        [lyr_analysis_col, "casfri_area"]
-                    ]
-                    .groupby(lyr_analysis_col)
-                    .sum()
+        for table, columns, by_layer in SUMMARY_TABLES:
+            logger.info(table)
+            if distributions is None:
+                table_distributions = get_area_distributions(
+                    self._data[table], self._data["cas"], columns, by_layer
                 )
-                self.insert(df, "lyr", lyr_analysis_col, layer_id)
-
-        logger.info("nfl")
-        nfl_layer_ids = list(nfl["layer"].unique())
-        for layer_id in nfl_layer_ids:
-            for nfl_analysis_col in _nfl_analysis_cols:
-                df = (
-                    nfl.loc[nfl.layer == layer_id][
-                        [nfl_analysis_col, "casfri_area"]
-                    ]
-                    .groupby(nfl_analysis_col)
-                    .sum()
-                )
-                self.insert(df, "nfl", nfl_analysis_col, layer_id)
-
-        logger.info("dst")
-        dst_layer_ids = list(dst["layer"].unique())
-        for layer_id in dst_layer_ids:
-            for dst_analysis_col in _dst_analysis_cols:
-                df = (
-                    dst.loc[dst.layer == layer_id][
-                        [dst_analysis_col, "casfri_area"]
-                    ]
-                    .groupby(dst_analysis_col)
-                    .sum()
-                )
-                self.insert(df, "dst", dst_analysis_col, layer_id)
+            else:
+                table_distributions = distributions[table]
+            for layer_id, column, df in table_distributions:
+                self.insert(df, table, column, layer_id)
 
     def save_summary_tables(self, output_dir):
         if not os.path.exists(output_dir):
@@ -265,37 +346,267 @@ class Summary:
                     df.to_csv(os.path.join(output_dir, f"{key}.csv"))
 
 
-def load_summary(data_dir: str) -> Summary:
-    data = casfri_data.load_parquet(data_dir)
-    for name in ["lyr", "eco", "nfl", "dst"]:
-        data[name] = _merge_area(data[name], data["cas"])
-    return Summary(data)
-
-
-def display_summary(inventory_id: str, summary: Summary) -> None:
-    display(Markdown(f"# {inventory_id}"))
-
-    display(Markdown(f"## {inventory_id} hdr summary"))
-    display(summary.get_raw_table("hdr").transpose())
-
-    for table in summary.get_tables():
-        display(Markdown(f"## {table} summary"))
-        for layer in summary.get_layers(table):
-            if layer is not None:
-                display(Markdown(f"### {table} summary: layer {layer}"))
-            summary_data = summary.get_summary_data(table, layer)
-            for key, df in summary_data.items():
-                display(Markdown(f"#### {key}"))
-                if df.index.is_numeric() and len(df.index) > 1:
-                    df.plot(marker="o", linestyle="none", figsize=(15, 5))
-                else:
-                    df.plot(kind="bar", figsize=(15, 5))
-                plt.show()
-                plt.close("all")
-            display(
-                Markdown(
-                    f"#### {table} layer: {layer} null and "
-                    "undefined value summary"
+def load_summary(
+    data_dir: str,
+    out_of_core: bool = False,
+    memory_limit_mb: int = None,
+    threads: int = None,
+) -> Summary:
+    """Create the summary of an extracted inventory
+
+    Args:
+        data_dir (str): directory containing the extracted parquet tables
+        out_of_core (bool, optional): if set the summary is aggregated by
+            streaming queries over the parquet tables, see
+            :py:func:`load_out_of_core_summary`, rather than by loading
+            all tables into memory. Defaults to False.
+        memory_limit_mb (int, optional): the out of core memory limit.
+            Defaults to None.
+        threads (int, optional): the number of out of core query threads.
+            Defaults to None.
+
+    Returns:
+        Summary: the summary
+    """
+    if out_of_core:
+        return load_out_of_core_summary(data_dir, memory_limit_mb, threads)
+    return Summary(casfri_data.load_parquet(data_dir))
+
+
+def _split_distributions(
+    result: pa.Table,
+    columns: list[str],
+    by_layer: bool,
+    inventory_ids: list[str],
+) -> dict[str, Distributions]:
+    """Split the result of a query generated by
+    :py:func:`sql.get_area_distribution_query` into the distributions of
+    each inventory, ordered as by :py:func:`get_area_distributions`.
+    """
+    keys = ["inventory_id", "layer"] if by_layer else ["inventory_id"]
+    layers = {
+        inventory_id: [] if by_layer else [None]
+        for inventory_id in inventory_ids
+    }
+    if by_layer:
+        inventory_layers = (
+            result.select(keys).to_pandas().dropna().drop_duplicates()
+        )
+        for inventory_id, layer in inventory_layers.sort_values(
+            keys
+        ).itertuples(index=False):
+            if inventory_id in layers:
+                layers[inventory_id].append(layer)
+
+    distributions = {}
+    for column in columns:
+        # each column is converted separately so that its type is not
+        # widened by the null values of the rows of other grouping sets
+        df = (
+            result.select(keys + [column, "casfri_area"])
+            .filter(pyarrow.compute.is_valid(result[column]))
+            .to_pandas()
+            .sort_values(column)
+        )
+        groups = dict(list(df.groupby(keys)))
+        for inventory_id, inventory_layers in layers.items():
+            for layer in inventory_layers:
+                key = (inventory_id, layer) if by_layer else (inventory_id,)
+                distributions[(inventory_id, layer, column)] = groups.get(
+                    key, df.iloc[0:0]
+                ).set_index(column)[["casfri_area"]]
+    return {
+        inventory_id: [
+            (layer, column, distributions[(inventory_id, layer, column)])
+            for layer in layers[inventory_id]
+            for column in columns
+        ]
+        for inventory_id in inventory_ids
+    }
+
+
+def _create_summaries(
+    inventory_ids: list[str],
+    hdr: pd.DataFrame,
+    distribution_results: dict[str, pa.Table],
+    table_area_result: pa.Table,
+) -> dict[str, Summary]:
+    distributions = {inventory_id: {} for inventory_id in inventory_ids}
+    for table, columns, by_layer in SUMMARY_TABLES:
+        split = _split_distributions(
+            distribution_results[table], columns, by_layer, inventory_ids
+        )
+        for inventory_id, table_distributions in split.items():
+            distributions[inventory_id][table] = table_distributions
+
+    table_areas = {
+        inventory_id: {table: 0.0 for table, _, _ in SUMMARY_TABLES}
+        for inventory_id in inventory_ids
+    }
+    for table, inventory_id, area in table_area_result.to_pandas()[
+        ["table_name", "inventory_id", "casfri_area"]
+    ].itertuples(index=False):
+        if inventory_id in table_areas and not pd.isnull(area):
+            table_areas[inventory_id][table] = area
+
+    return {
+        inventory_id: Summary(
+            {
+                "hdr": hdr.loc[
+                    hdr["inventory_id"] == inventory_id
+                ].reset_index(drop=True)
+            },
+            distributions[inventory_id],
+            table_areas[inventory_id],
+        )
+        for inventory_id in inventory_ids
+    }
+
+
+def load_database_summaries(
+    url: str, inventory_ids: list[str], max_connections: int = 1
+) -> dict[str, Summary]:
+    """Create the summaries of the specified inventories by aggregating the
+    area distributions in the casfri database, without extracting the raw
+    tables.  Only the aggregated distributions are transferred.
+
+    Args:
+        url (str): sqlalchemy connection url to the casfri database
+        inventory_ids (list[str]): the inventory ids to summarize
+        max_connections (int, optional): the maximum number of concurrent
+            queries. Defaults to 1.
+
+    Returns:
+        dict[str, Summary]: the summary of each inventory by inventory id
+    """
+    table_sources = {table: f"{table}_all" for table, _, _ in SUMMARY_TABLES}
+    queries = {
+        table: sql.get_area_distribution_query(
+            table,
+            table_sources[table],
+            table_sources["cas"],
+            columns,
+            by_layer,
+            inventory_ids,
+        )
+        for table, columns, by_layer in SUMMARY_TABLES
+    }
+    queries["table_areas"] = sql.get_table_area_query(
+        table_sources, table_sources["cas"], inventory_ids
+    )
+    queries["hdr"] = sql.get_hdr_query(inventory_ids)
+    results = casfri_data.read_arrow_tables(url, queries, max_connections)
+    return _create_summaries(
+        inventory_ids,
+        results["hdr"].to_pandas(),
+        results,
+        results["table_areas"],
+    )
+
+
+def _get_parquet_source(data_dir: str, table: str) -> str:
+    path = casfri_data.get_table_path(data_dir, table)
+    if os.path.isdir(path):
+        pattern = os.path.join(path, "**", "*.parquet").replace("'", "''")
+        return f"read_parquet('{pattern}', hive_partitioning = true)"
+    return "read_parquet('{}')".format(path.replace("'", "''"))
+
+
+def load_out_of_core_summary(
+    data_dir: str, memory_limit_mb: int = None, threads: int = None
+) -> Summary:
+    """Create the summary of an extracted inventory with the aggregation
+    queries of :py:func:`load_database_summaries` run by an embedded DuckDB
+    database over the parquet tables.  The tables are scanned in parallel
+    and are not loaded into memory, and aggregation state beyond the memory
+    limit is spilled to a temporary directory.
+
+    Args:
+        data_dir (str): directory containing the extracted parquet tables
+        memory_limit_mb (int, optional): the DuckDB memory limit in
+            megabytes. If not set the DuckDB default is used.
+        threads (int, optional): the number of query threads. If not set
+            all cores are used.
+
+    Raises:
+        ValueError: the hdr table does not define a single inventory
+
+    Returns:
+        Summary: the summary
+    """
+    hdr = casfri_data.read_table(data_dir, "hdr")
+    inventory_ids = [str(x) for x in hdr["inventory_id"].unique()]
+    if len(inventory_ids) != 1:
+        raise ValueError(
+            f"expected a single inventory in {data_dir}, found "
+            f"{inventory_ids}"
+        )
+    table_sources = {
+        table: _get_parquet_source(data_dir, table)
+        for table, _, _ in SUMMARY_TABLES
+    }
+    queries = {
+        table: sql.get_area_distribution_query(
+            table,
+            table_sources[table],
+            table_sources["cas"],
+            columns,
+            by_layer,
+        )
+        for table, columns, by_layer in SUMMARY_TABLES
+    }
+    queries["table_areas"] = sql.get_table_area_query(
+        table_sources, table_sources["cas"]
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = {"temp_directory": temp_dir}
+        if memory_limit_mb:
+            config["memory_limit"] = f"{memory_limit_mb}MB"
+        if threads:
+            config["threads"] = threads
+        with duckdb.connect(config=config) as connection:
+            results = {}
+            for name, query in queries.items():
+                logger.info(f"query: {query}")
+                results[name] = connection.execute(query).fetch_arrow_table()
+    return _create_summaries(
+        inventory_ids, hdr, results, results["table_areas"]
+    )[inventory_ids[0]]
+
+
+def display_summary(
+    inventory_id: str, summary: Summary, workers: int = None
+) -> None:
+    with tempfile.TemporaryDirectory() as figure_dir:
+        # render every figure on a process pool before displaying
+        figures: dict[str, pd.DataFrame] = {}
+        figure_paths: dict[str, str] = {}
+        for table in summary.get_tables():
+            for layer in summary.get_layers(table):
+                for key, df in summary.get_summary_data(table, layer).items():
+                    figure_paths[key] = summary_figures.add_figure(
+                        figures, df, figure_dir
+                    )
+        summary_figures.render_figures(figures, workers)
+
+        display(Markdown(f"# {inventory_id}"))
+
+        display(Markdown(f"## {inventory_id} hdr summary"))
+        display(summary.get_raw_table("hdr").transpose())
+
+        for table in summary.get_tables():
+            display(Markdown(f"## {table} summary"))
+            for layer in summary.get_layers(table):
+                if layer is not None:
+                    display(Markdown(f"### {table} summary: layer {layer}"))
+                summary_data = summary.get_summary_data(table, layer)
+                for key in summary_data.keys():
+                    display(Markdown(f"#### {key}"))
+                    display(Image(filename=figure_paths[key]))
+                display(
+                    Markdown(
+                        f"#### {table} layer: {layer} null and "
+                        "undefined value summary"
+                    )
                 )
-            )
-            display(summary.get_null_summary(table, layer))
+                display(summary.get_null_summary(table, layer))
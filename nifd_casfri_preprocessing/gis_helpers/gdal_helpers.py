@@ -1,5 +1,9 @@
 import os
+import copy
+import threading
+from collections import OrderedDict
 from typing import Tuple
+from typing import Union
 from contextlib import contextmanager
 import numpy as np
 from osgeo import gdal
@@ -8,6 +12,16 @@ from nifd_casfri_preprocessing.gis_helpers.raster_bound import RasterBound
 
 
 class GDALHelperDataset:
+    """A rectangular section of a raster band, and the metadata of the
+    raster.
+
+    The section's pixels are held in the data array, which is either an
+    in-memory array, a read-only memory-mapped view of a cache created by
+    :py:func:`write_raster_cache`, or None.  If None, the pixels are read
+    from the raster on the first access of data, and windows of the section
+    can be read with :py:meth:`read_window` without reading all of it.
+    """
+
     def __init__(
         self,
         path: str,
@@ -17,14 +31,16 @@ class GDALHelperDataset:
         nodata: int,
         geo_transform: Tuple[float, float, float, float, float, float],
         projection: str,
+        raster_band: int = 1,
     ):
         self.path = path
-        self.data = data
+        self._data = data
         self.data_bounds = data_bounds
         self.raster_bounds = raster_bounds
         self.nodata = nodata
         self.geo_transform = geo_transform
         self.projection = projection
+        self.raster_band = raster_band
 
         (
             self.ulx,
@@ -37,10 +53,200 @@ class GDALHelperDataset:
         self.lrx = self.ulx + (self.data_bounds.x_size * self.xres)
         self.lry = self.uly + (self.data_bounds.y_size * self.yres)
 
+    @property
+    def data(self) -> np.ndarray:
+        if self._data is None:
+            self._data = _read_window(
+                self.path, self.data_bounds, self.raster_band
+            )
+        return self._data
+
+    @data.setter
+    def data(self, value: np.ndarray):
+        self._data = value
+
+    @property
+    def is_loaded(self) -> bool:
+        """True if the section's pixels are held in an array or memory
+        map, rather than read from the raster on access
+        """
+        return self._data is not None
+
+    def read_window(self, bounds: RasterBound) -> np.ndarray:
+        """Read a window of this section.  If the section is loaded the
+        result is a view of its data, otherwise only the window is read
+        from the raster.
+
+        Args:
+            bounds (RasterBound): the window in pixel coordinates of the
+                entire raster. It must be within data_bounds.
+
+        Raises:
+            ValueError: the window is not within data_bounds
+
+        Returns:
+            np.ndarray: the window's pixels
+        """
+        x_off = bounds.x_off - self.data_bounds.x_off
+        y_off = bounds.y_off - self.data_bounds.y_off
+        if (
+            x_off < 0
+            or y_off < 0
+            or x_off + bounds.x_size > self.data_bounds.x_size
+            or y_off + bounds.y_size > self.data_bounds.y_size
+        ):
+            raise ValueError("window out of bounds")
+        if self._data is None:
+            return _read_window(self.path, bounds, self.raster_band)
+        return self._data[
+            slice(y_off, y_off + bounds.y_size),
+            slice(x_off, x_off + bounds.x_size),
+        ]
+
+
+class RasterSession:
+    """A pool of open raster datasets, keyed by path, that are reused
+    across reads and writes instead of being opened and closed for each.
+    At most max_open_datasets are kept open, the least recently used is
+    flushed and closed when another is opened.
+
+    Rasters open in a session must not be modified by other dataset
+    handles, for example by gdal.Warp, until they are closed in the session.
+
+    Args:
+        max_open_datasets (int, optional): the maximum number of open
+            datasets. Defaults to 8.
+    """
+
+    def __init__(self, max_open_datasets: int = 8):
+        if max_open_datasets < 1:
+            raise ValueError("max_open_datasets must be at least 1")
+        self._max_open_datasets = max_open_datasets
+        # the open dataset, and whether it is open for update, by path
+        self._datasets: OrderedDict[str, Tuple[gdal.Dataset, bool]] = (
+            OrderedDict()
+        )
+        self._pid = os.getpid()
+
+    @property
+    def pid(self) -> int:
+        """the id of the process that owns the session's datasets"""
+        return self._pid
+
+    def open(self, path: str, update: bool = False) -> gdal.Dataset:
+        """Get the open dataset for the specified path, opening it if
+        required.  A dataset that is open read only is re-opened if update
+        is requested.
+
+        Args:
+            path (str): path to a raster dataset
+            update (bool, optional): if set the dataset is opened for
+                update. Defaults to False.
+
+        Raises:
+            ValueError: the path does not exist or could not be opened
+
+        Returns:
+            gdal.Dataset: the open dataset, which remains owned by the
+                session
+        """
+        entry = self._datasets.get(path)
+        if entry is not None:
+            dataset, is_update = entry
+            if is_update or not update:
+                self._datasets.move_to_end(path)
+                return dataset
+            self.close(path)
+        if not os.path.exists(path):
+            raise ValueError("specified path does not exist {}".format(path))
+        dataset = gdal.Open(
+            path, gdal.GA_Update if update else gdal.GA_ReadOnly
+        )
+        if not dataset:
+            raise ValueError("failed to open '{}'".format(path))
+        self._datasets[path] = (dataset, update)
+        while len(self._datasets) > self._max_open_datasets:
+            self.close(next(iter(self._datasets)))
+        return dataset
+
+    def flush(self, path: str = None) -> None:
+        """Write the cached changes of the specified dataset, or of every
+        open dataset, to disk.
+
+        Args:
+            path (str, optional): the dataset path. Defaults to None.
+        """
+        paths = list(self._datasets.keys()) if path is None else [path]
+        for flush_path in paths:
+            entry = self._datasets.get(flush_path)
+            if entry is not None:
+                entry[0].FlushCache()
+
+    def close(self, path: str = None) -> None:
+        """Flush and close the specified dataset, or every open dataset.
+
+        Args:
+            path (str, optional): the dataset path. Defaults to None.
+        """
+        paths = list(self._datasets.keys()) if path is None else [path]
+        for close_path in paths:
+            entry = self._datasets.pop(close_path, None)
+            if entry is not None:
+                entry[0].FlushCache()
+                del entry
+
+    def __enter__(self) -> "RasterSession":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+_active_session = threading.local()
+
+
+def get_active_session() -> RasterSession:
+    """Get the session started by :py:func:`raster_session` in the current
+    thread and process, or None.
+    """
+    session = getattr(_active_session, "session", None)
+    if session is not None and session.pid == os.getpid():
+        return session
+    return None
+
+
+@contextmanager
+def raster_session(max_open_datasets: int = 8):
+    """Keep the rasters opened by the functions of this module open in a
+    :py:class:`RasterSession` until the context exits, rather than opening
+    and closing them in each call.  Chunked reads and writes of the same
+    raster then parse its header once.  If a session is already active in
+    this thread it is used, and closed when the outermost context exits.
+
+    Args:
+        max_open_datasets (int, optional): the maximum number of open
+            datasets. Defaults to 8.
+
+    Yields:
+        RasterSession: the active session
+    """
+    session = get_active_session()
+    if session is not None:
+        yield session
+        return
+    session = RasterSession(max_open_datasets)
+    _active_session.session = session
+    try:
+        yield session
+    finally:
+        _active_session.session = None
+        session.close()
+
 
 @contextmanager
 def __open(*args):
-    """pass args to gdal.Open
+    """pass args to gdal.Open, or, if a :py:func:`raster_session` is
+    active, get the dataset from the session, which keeps it open.
 
     Raises:
         ValueError: raised if the first arg is not an existing file
@@ -49,6 +255,11 @@ def __open(*args):
     Returns:
         object: return value of gdal.Open
     """
+    session = get_active_session()
+    if session is not None:
+        update = len(args) > 1 and args[1] == gdal.GA_Update
+        yield session.open(args[0], update)
+        return
     if not os.path.exists(args[0]):
         raise ValueError("specified path does not exist {}".format(args[0]))
     dataset = gdal.Open(*args)
@@ -84,6 +295,50 @@ def get_raster_dimension(path):
         return bounds
 
 
+def get_raster_block_size(path, band_num=1):
+    """Gets the natural block size (the internal tile or strip dimension) of
+    the specified raster band.  Reads and writes aligned to this size avoid
+    decoding or encoding a block more than once.
+
+    Args:
+        path (str): path to a raster dataset
+        band_num (int, optional): The band number for which to fetch the
+            block size. Defaults to 1.
+
+    Returns:
+        tuple: the block (x_size, y_size) in pixels
+    """
+    with __open_band(band_num, path) as band:
+        x_size, y_size = band.GetBlockSize()
+        return x_size, y_size
+
+
+def get_raster_geo_transform(path):
+    """Get the geo transform of the raster at the specified path
+
+    Args:
+        path (str): the path to a raster dataset
+
+    Returns:
+        tuple: the gdal geo transform (ulx, xres, xskew, uly, yskew, yres)
+    """
+    with __open(path) as dataset:
+        return dataset.GetGeoTransform()
+
+
+def get_raster_projection(path):
+    """Get the projection of the raster at the specified path
+
+    Args:
+        path (str): the path to a raster dataset
+
+    Returns:
+        str: the projection in well known text format
+    """
+    with __open(path) as dataset:
+        return dataset.GetProjection()
+
+
 def get_raster_no_data(path, band_num=1):
     """Get the no-data value from the raster at the specified path
 
@@ -114,6 +369,85 @@ def write_output(path, data, x_off, y_off, band_num=1):
         band.WriteArray(data, x_off, y_off)
 
 
+def _get_read_bounds(dataset, bounds):
+    if not bounds:
+        return RasterBound(0, 0, dataset.RasterXSize, dataset.RasterYSize)
+    if bounds.x_size < 1 or bounds.y_size < 1:
+        raise ValueError("x_size, y_size may not be less than 1")
+    if bounds.x_off < 0 or bounds.y_off < 0:
+        raise ValueError("x_off, y_off may not be less than 0")
+    if dataset.RasterXSize - bounds.x_off < bounds.x_size:
+        raise ValueError("x_off, x_size out of bounds")
+    if dataset.RasterYSize - bounds.y_off < bounds.y_size:
+        raise ValueError("y_off, y_size out of bounds")
+    return RasterBound(
+        bounds.x_off, bounds.y_off, bounds.x_size, bounds.y_size
+    )
+
+
+def _read_window(path, bounds, raster_band=1):
+    with __open_band(raster_band, path) as band:
+        return band.ReadAsArray(
+            bounds.x_off, bounds.y_off, bounds.x_size, bounds.y_size
+        )
+
+
+def open_dataset(path, bounds=None, raster_band=1, cache_path=None):
+    """Open an entire raster or a rectangular section of a raster without
+    reading its pixels into memory.
+
+    Args:
+        path (str): path to a raster dataset
+        bounds (RasterBound, optional): if specified defines the rectangular
+            section to open
+        raster_band (int, optional): the raster band to open. Defaults to 1.
+        cache_path (str, optional): path to a cache of the raster band
+            created by :py:func:`write_raster_cache`. If specified the data
+            of the result is a read-only memory-mapped view of the cache,
+            whose pages are shared by every process that maps it.
+            Otherwise the pixels are read from the raster when first
+            accessed. Defaults to None.
+
+    Raises:
+        ValueError: the specified coordinate parameters are out of bounds,
+            or the cache does not match the raster dimensions
+
+    Returns:
+        GDALHelperDataset: the raster section, see :py:func:`read_dataset`
+    """
+    with __open(path) as dataset:
+        data_bounds = _get_read_bounds(dataset, bounds)
+        band = dataset.GetRasterBand(raster_band)
+        result = GDALHelperDataset(
+            path=path,
+            data=None,
+            data_bounds=data_bounds,
+            raster_bounds=RasterBound(
+                0, 0, dataset.RasterXSize, dataset.RasterYSize
+            ),
+            nodata=band.GetNoDataValue(),
+            geo_transform=dataset.GetGeoTransform(),
+            projection=dataset.GetProjection(),
+            raster_band=raster_band,
+        )
+        del band
+    if cache_path is not None:
+        cache = np.load(cache_path, mmap_mode="r")
+        if cache.shape != (
+            result.raster_bounds.y_size,
+            result.raster_bounds.x_size,
+        ):
+            raise ValueError(
+                f"cache {cache_path} shape {cache.shape} does not match "
+                f"raster {path}"
+            )
+        result.data = cache[
+            slice(data_bounds.y_off, data_bounds.y_off + data_bounds.y_size),
+            slice(data_bounds.x_off, data_bounds.x_off + data_bounds.x_size),
+        ]
+    return result
+
+
 def read_dataset(path, bounds=None, raster_band=1):
     """Read an entire raster or a rectangular section of a raster
 
@@ -139,49 +473,272 @@ def read_dataset(path, bounds=None, raster_band=1):
     """
 
     with __open(path) as dataset:
-        x_off = 0
-        y_off = 0
-        x_size = dataset.RasterXSize
-        y_size = dataset.RasterYSize
-        if bounds:
-            if bounds.x_size < 1 or bounds.y_size < 1:
-                raise ValueError("x_size, y_size may not be less than 1")
-            if bounds.x_off < 0 or bounds.y_off < 0:
-                raise ValueError("x_off, y_off may not be less than 0")
-            if x_size - bounds.x_off < bounds.x_size:
-                raise ValueError("x_off, x_size out of bounds")
-            if y_size - bounds.y_off < bounds.y_size:
-                raise ValueError("y_off, y_size out of bounds")
-            x_off = bounds.x_off
-            y_off = bounds.y_off
-            x_size = bounds.x_size
-            y_size = bounds.y_size
-
+        data_bounds = _get_read_bounds(dataset, bounds)
         band = dataset.GetRasterBand(raster_band)
 
         result = GDALHelperDataset(
             path=path,
-            data=np.array(band.ReadAsArray(x_off, y_off, x_size, y_size)),
-            data_bounds=RasterBound(x_off, y_off, x_size, y_size),
+            data=band.ReadAsArray(
+                data_bounds.x_off,
+                data_bounds.y_off,
+                data_bounds.x_size,
+                data_bounds.y_size,
+            ),
+            data_bounds=data_bounds,
             raster_bounds=RasterBound(
                 0, 0, dataset.RasterXSize, dataset.RasterYSize
             ),
             nodata=band.GetNoDataValue(),
             geo_transform=dataset.GetGeoTransform(),
             projection=dataset.GetProjection(),
+            raster_band=raster_band,
         )
 
         del band
         return result
 
 
-def get_default_geotiff_creation_options():
+def write_raster_cache(path, cache_path, chunks=None, raster_band=1):
+    """Decode a raster band into an uncompressed numpy .npy file.  The
+    cache can be opened with ``numpy.load(cache_path, mmap_mode="r")`` by
+    any number of processes, which then share the same pages instead of each
+    holding, or being sent, a copy of the raster.
+
+    Args:
+        path (str): path to a raster dataset
+        cache_path (str): path to the .npy file to create
+        chunks (iterable, optional): sequence of RasterBound objects covering
+            the raster, used to limit the memory used while decoding. If not
+            specified the band is decoded in one read.
+        raster_band (int, optional): the raster band to cache. Defaults to 1.
+    """
+    with __open_band(raster_band, path) as band:
+        if chunks is None:
+            chunks = [RasterBound(0, 0, band.XSize, band.YSize)]
+        cache = np.lib.format.open_memmap(
+            cache_path,
+            mode="w+",
+            dtype=gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType),
+            shape=(band.YSize, band.XSize),
+        )
+        for chunk in chunks:
+            # decode directly into the mapped pages
+            band.ReadAsArray(
+                chunk.x_off,
+                chunk.y_off,
+                chunk.x_size,
+                chunk.y_size,
+                buf_obj=cache[
+                    slice(chunk.y_off, chunk.y_off + chunk.y_size),
+                    slice(chunk.x_off, chunk.x_off + chunk.x_size),
+                ],
+            )
+        cache.flush()
+        del cache
+
+
+class RasterProfile:
+    """GeoTIFF output settings shared by every raster written by this
+    package.
+
+    Args:
+        compress (str, optional): the GeoTIFF COMPRESS option, for example
+            "DEFLATE", "ZSTD", "LZW" or "NONE". Defaults to "DEFLATE".
+        level (int, optional): the DEFLATE or ZSTD compression level. If
+            not specified the gdal default is used. Defaults to None.
+        predictor (bool, optional): if set, horizontal differencing is
+            applied before compression, using the floating point predictor
+            for floating point rasters. Defaults to True.
+        tiled (bool, optional): if set, the output is internally tiled
+            rather than striped. Defaults to True.
+        block_size (int, optional): the tile width and height when tiled.
+            Defaults to 512.
+        num_threads (str, optional): the NUM_THREADS option used for
+            compression, for example "ALL_CPUS" or "4". If not specified,
+            compression is single threaded. Defaults to "ALL_CPUS".
+        overview_levels (list[int], optional): decimation factors of the
+            overviews built after a raster is written. Defaults to None,
+            which builds no overviews.
+    """
+
+    def __init__(
+        self,
+        compress: str = "DEFLATE",
+        level: int = None,
+        predictor: bool = True,
+        tiled: bool = True,
+        block_size: int = 512,
+        num_threads: str = "ALL_CPUS",
+        overview_levels: list[int] = None,
+    ):
+        self.compress = compress.upper()
+        self.level = level
+        self.predictor = predictor
+        self.tiled = tiled
+        self.block_size = block_size
+        self.num_threads = num_threads
+        self.overview_levels = list(overview_levels or [])
+
+    def get_predictor(self, data_type=None) -> int:
+        """Get the PREDICTOR creation option value for the specified data
+        type: 1 (none), 2 (horizontal) or 3 (floating point).
+
+        Args:
+            data_type (optional): numpy type of the raster. Defaults to
+                None, which is treated as an integer type.
+
+        Returns:
+            int: the predictor
+        """
+        if not self.predictor or self.compress == "NONE":
+            return 1
+        if data_type is not None and np.issubdtype(
+            np.dtype(data_type), np.floating
+        ):
+            return 3
+        return 2
+
+    def get_creation_options(self, data_type=None) -> list[str]:
+        """Get the GeoTIFF creation options of this profile
+
+        Args:
+            data_type (optional): numpy type of the created raster, which
+                selects the predictor. Defaults to None.
+
+        Returns:
+            list[str]: the creation options
+        """
+        options = [f"COMPRESS={self.compress}", "BIGTIFF=YES"]
+        if self.level is not None:
+            if self.compress == "DEFLATE":
+                options.append(f"ZLEVEL={self.level}")
+            elif self.compress == "ZSTD":
+                options.append(f"ZSTD_LEVEL={self.level}")
+        predictor = self.get_predictor(data_type)
+        if predictor != 1:
+            options.append(f"PREDICTOR={predictor}")
+        if self.tiled:
+            options.extend(
+                [
+                    "TILED=YES",
+                    f"BLOCKXSIZE={self.block_size}",
+                    f"BLOCKYSIZE={self.block_size}",
+                ]
+            )
+        if self.num_threads and self.compress != "NONE":
+            options.append(f"NUM_THREADS={self.num_threads}")
+        return options
+
+
+RASTER_PROFILES = {
+    # tiled, compressed with a predictor, and without overviews
+    "default": RasterProfile(),
+    # the striped output of earlier versions of this package
+    "striped": RasterProfile(predictor=False, tiled=False, num_threads=None),
+    "zstd": RasterProfile(compress="ZSTD", level=9),
+    "zstd_fast": RasterProfile(compress="ZSTD", level=1),
+    "lzw": RasterProfile(compress="LZW"),
+    "uncompressed": RasterProfile(compress="NONE"),
+    # suitable for viewing and for windowed reads at coarse resolutions
+    "overviews": RasterProfile(overview_levels=[2, 4, 8, 16, 32]),
+}
+
+DEFAULT_RASTER_PROFILE = "default"
+
+
+def get_raster_profile(
+    profile: Union[str, RasterProfile] = None,
+) -> RasterProfile:
+    """Get a raster profile by name
+
+    Args:
+        profile (str, RasterProfile, optional): a key of RASTER_PROFILES,
+            or a profile which is returned as is. Defaults to None, which
+            returns the default profile.
+
+    Raises:
+        ValueError: the specified name is not a key of RASTER_PROFILES
+
+    Returns:
+        RasterProfile: the raster profile
+    """
+    if isinstance(profile, RasterProfile):
+        return profile
+    name = profile if profile else DEFAULT_RASTER_PROFILE
+    if name not in RASTER_PROFILES:
+        raise ValueError(
+            f"unknown raster profile '{name}', expected one of "
+            f"{list(RASTER_PROFILES.keys())}"
+        )
+    return copy.deepcopy(RASTER_PROFILES[name])
+
+
+def get_default_geotiff_creation_options(data_type=None, profile=None):
     """Returns package default gdal options for creating geotiff rasters.
 
+    Args:
+        data_type (optional): numpy type of the created raster, see
+            :py:meth:`RasterProfile.get_creation_options`. Defaults to None.
+        profile (str, RasterProfile, optional): the raster profile, see
+            :py:func:`get_raster_profile`. Defaults to None.
+
     Returns:
         list: list of options
     """
-    return ["COMPRESS=DEFLATE", "BIGTIFF=YES"]
+    return get_raster_profile(profile).get_creation_options(data_type)
+
+
+@contextmanager
+def gdal_config_options(options: dict):
+    """Set gdal configuration options for the duration of the context,
+    restoring their previous values on exit.
+
+    Args:
+        options (dict): the option values by name
+    """
+    previous = {key: gdal.GetConfigOption(key) for key in options}
+    for key, value in options.items():
+        gdal.SetConfigOption(key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            gdal.SetConfigOption(key, value)
+
+
+def build_overviews(path, profile=None, resampling="NEAREST"):
+    """Build internal overviews for the raster at the specified path using
+    the overview levels and compression of the specified profile.  Nothing
+    is done if the profile has no overview levels.
+
+    Args:
+        path (str): path to a raster dataset
+        profile (str, RasterProfile, optional): the raster profile, see
+            :py:func:`get_raster_profile`. Defaults to None.
+        resampling (str, optional): the overview resampling method. Use
+            "NEAREST" for categorical values such as ids and "AVERAGE" for
+            continuous values. Defaults to "NEAREST".
+    """
+    profile = get_raster_profile(profile)
+    if not profile.overview_levels:
+        return
+    with __open(path, gdal.GA_Update) as dataset:
+        data_type = gdal_array.GDALTypeCodeToNumericTypeCode(
+            dataset.GetRasterBand(1).DataType
+        )
+        config = {
+            "COMPRESS_OVERVIEW": profile.compress,
+            "PREDICTOR_OVERVIEW": str(profile.get_predictor(data_type)),
+            "GDAL_TIFF_OVR_BLOCKSIZE": str(profile.block_size),
+            "GDAL_NUM_THREADS": profile.num_threads,
+        }
+        if profile.level is not None:
+            if profile.compress == "DEFLATE":
+                config["ZLEVEL_OVERVIEW"] = str(profile.level)
+            elif profile.compress == "ZSTD":
+                config["ZSTD_LEVEL_OVERVIEW"] = str(profile.level)
+        with gdal_config_options(config):
+            dataset.BuildOverviews(resampling, profile.overview_levels)
 
 
 def create_empty_raster(
@@ -213,41 +770,133 @@ def create_empty_raster(
         options (list, optional): list of creation options passed to gdal
             driver.Create options parameter
     """
-    if not options:
-        options = []
     with __open(source_path) as source_dataset:
-        driver = None
-        if driver_name:
-            driver = gdal.GetDriverByName(driver_name)
-        else:
-            driver = source_dataset.GetDriver()
-        if data_type:
-            gdal_data_type = gdal_array.NumericTypeCodeToGDALTypeCode(
-                data_type
-            )
-            if not gdal_data_type:
-                raise ValueError(
-                    f"specified data_type {data_type} is not convertable to "
-                    "a gdal data type."
-                )
-        else:
-            gdal_data_type = source_dataset.GetRasterBand(raster_band).DataType
-
-        new_dataset = driver.Create(
+        new_dataset = __create_raster(
+            source_dataset,
             dest_path,
-            int(source_dataset.RasterXSize),
-            int(source_dataset.RasterYSize),
-            1,
-            gdal_data_type,
+            driver_name,
+            data_type,
+            nodata,
+            raster_band,
             options,
         )
-        new_dataset.SetGeoTransform(source_dataset.GetGeoTransform())
-        new_dataset.SetProjection(source_dataset.GetProjection())
-        if nodata is not None:
-            new_dataset.GetRasterBand(1).SetNoDataValue(nodata)
-        else:
-            new_dataset.GetRasterBand(1).SetNoDataValue(
-                source_dataset.GetRasterBand(raster_band).GetNoDataValue()
-            )
-
         del new_dataset
+
+
+@contextmanager
+def create_rasters(
+    source_path,
+    dest_paths,
+    driver_name=None,
+    data_type=None,
+    nodata=None,
+    raster_band=1,
+    options=[],
+):
+    """
+    Create several single band rasters based on the dimensions and
+    geospatial metadata of the source raster and keep them open for writing.
+    The created rasters are flushed and closed on exit.
+
+    Writing each created raster once, in block order, through the open
+    dataset avoids re-opening, and re-compressing, the output in update
+    mode for every write.
+
+    Args:
+        source_path (str): path to the source raster
+        dest_paths (list): paths to the created rasters
+        driver_name (str, optional): see :py:func:`create_empty_raster`
+        data_type (int, optional): see :py:func:`create_empty_raster`
+        nodata (float, int, optional): see :py:func:`create_empty_raster`
+        raster_band (int, optional): see :py:func:`create_empty_raster`
+        options (list, optional): see :py:func:`create_empty_raster`
+
+    Yields:
+        dict: the open datasets keyed by dest path. Use
+            :py:func:`write_dataset_output` to write to them.
+    """
+    datasets = {}
+    try:
+        with __open(source_path) as source_dataset:
+            for dest_path in dest_paths:
+                datasets[dest_path] = __create_raster(
+                    source_dataset,
+                    dest_path,
+                    driver_name,
+                    data_type,
+                    nodata,
+                    raster_band,
+                    options,
+                )
+        yield datasets
+    finally:
+        for dest_path in list(datasets.keys()):
+            datasets[dest_path].FlushCache()
+            del datasets[dest_path]
+
+
+def write_dataset_output(dataset, data, x_off, y_off, band_num=1):
+    """write a rectangular output to the specified open raster dataset
+
+    Args:
+        dataset (gdal.Dataset): a dataset open for writing, for example one
+            yielded by :py:func:`create_rasters`
+        data (numpy.ndarray): 2d data rectangle to write
+        x_off (int): the x raster coordinate of the upper left corner of the
+            data rectangle
+        y_off (int): the y raster coordinate of the upper left corner of the
+            data rectangle
+        band_num (int, optional): the band to write. Defaults to 1.
+    """
+    band = dataset.GetRasterBand(band_num)
+    band.WriteArray(data, x_off, y_off)
+    del band
+
+
+def __create_raster(
+    source_dataset,
+    dest_path,
+    driver_name,
+    data_type,
+    nodata,
+    raster_band,
+    options,
+):
+    if not options:
+        options = []
+    session = get_active_session()
+    if session is not None:
+        # the file is replaced, so a pooled handle to it would be stale
+        session.close(dest_path)
+    driver = None
+    if driver_name:
+        driver = gdal.GetDriverByName(driver_name)
+    else:
+        driver = source_dataset.GetDriver()
+    if data_type:
+        gdal_data_type = gdal_array.NumericTypeCodeToGDALTypeCode(data_type)
+        if not gdal_data_type:
+            raise ValueError(
+                f"specified data_type {data_type} is not convertable to "
+                "a gdal data type."
+            )
+    else:
+        gdal_data_type = source_dataset.GetRasterBand(raster_band).DataType
+
+    new_dataset = driver.Create(
+        dest_path,
+        int(source_dataset.RasterXSize),
+        int(source_dataset.RasterYSize),
+        1,
+        gdal_data_type,
+        options,
+    )
+    new_dataset.SetGeoTransform(source_dataset.GetGeoTransform())
+    new_dataset.SetProjection(source_dataset.GetProjection())
+    if nodata is not None:
+        new_dataset.GetRasterBand(1).SetNoDataValue(nodata)
+    else:
+        new_dataset.GetRasterBand(1).SetNoDataValue(
+            source_dataset.GetRasterBand(raster_band).GetNoDataValue()
+        )
+    return new_dataset
@@ -57,8 +57,8 @@ def get_raster_chunks(
         raise ValueError("parameters must be positive integers")
     n_cols = math.ceil(width / chunk_width)
     n_rows = math.ceil(height / chunk_height)
-    for col in range(0, n_cols):
-        for row in range(0, n_rows):
+    for row in range(0, n_rows):
+        for col in range(0, n_cols):
             yield __get_chunk_bounds(
                 width, height, chunk_width, chunk_height, row, col
             )
@@ -100,3 +100,54 @@ def get_memory_limited_raster_chunks(
     else:
         size = int(math.sqrt(max_pixels))
         return get_raster_chunks(width, height, size, size)
+
+
+def get_block_aligned_raster_chunks(
+    n_rasters: int,
+    width: int,
+    height: int,
+    block_width: int,
+    block_height: int,
+    memory_limit_MB: int,
+    bytes_per_pixel: int = 4,
+):
+    """Call :py:func:`get_raster_chunks` so that the chunks returned are
+    aligned to the specified raster block size and, when loaded, won't
+    consume memory in excess of the specified memory limit.  Chunks span as
+    many blocks on the x dimension as the memory limit allows so that striped
+    rasters are processed in whole strips.  A chunk is never smaller than a
+    single block.
+
+    Args:
+        n_rasters (int): the number of stacked rasters whose chunks will be
+            loaded into memory
+        width (int): the entire raster width in pixels (x dimension)
+        height (int): the entire raster height in pixels (y dimension)
+        block_width (int): the raster block width in pixels
+        block_height (int): the raster block height in pixels
+        memory_limit_MB (int): the maximum memory in megabytes that can be
+            loaded for the raster stack
+        bytes_per_pixel (int, optional): the number of bytes on each raster.
+            Defaults to 4.
+
+    Raises:
+        ValueError: Negative or zero parameters
+
+    Returns:
+        sequence: the memory limited sequence of RasterBound objects.
+    """
+    divisor = n_rasters * bytes_per_pixel / 1e6
+    if divisor <= 0 or block_width <= 0 or block_height <= 0:
+        raise ValueError("parameters must be positive")
+    max_pixels = memory_limit_MB / divisor
+    if max_pixels > (width * height):
+        return get_raster_chunks(width, height, width, height)
+    max_blocks = max(1, int(max_pixels // (block_width * block_height)))
+    n_blocks_x = min(math.ceil(width / block_width), max_blocks)
+    n_blocks_y = max(1, max_blocks // n_blocks_x)
+    return get_raster_chunks(
+        width,
+        height,
+        min(width, n_blocks_x * block_width),
+        min(height, n_blocks_y * block_height),
+    )
@@ -0,0 +1,251 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+from typing import Tuple
+import numpy as np
+import pandas as pd
+from osgeo import gdal
+from nifd_casfri_preprocessing.gis_helpers import raster_chunks
+from nifd_casfri_preprocessing.gis_helpers.raster_bound import RasterBound
+
+
+def get_vector_grid(
+    source: str, extent_sql_statement: str, resolution: float
+) -> Tuple[int, int, tuple, str, dict]:
+    """Get the raster grid that gdal.Rasterize creates for a vector query
+    and resolution: the extent of the query result snapped to a whole number
+    of pixels from its upper left corner.  The extent is computed by the
+    data source rather than by reading every geometry.
+
+    Args:
+        source (str): the gdal vector data source, for example a PG
+            connection string
+        extent_sql_statement (str): a query returning a single geometry
+            whose extent and spatial reference are those of the rasterized
+            geometry, for example
+            ``SELECT ST_SetSRID(ST_Extent(geometry)::geometry, ...)``, and
+            optionally other fields that are returned as is
+        resolution (float): the pixel size in the units of the geometry
+            spatial reference
+
+    Raises:
+        ValueError: the source could not be opened or queried
+
+    Returns:
+        Tuple[int, int, tuple, str, dict]: the raster width, height,
+            geotransform, projection as wkt, and the fields of the first
+            row of the extent query by name
+    """
+    dataset = gdal.OpenEx(source, gdal.OF_VECTOR)
+    if not dataset:
+        raise ValueError("failed to open the vector source")
+    layer = dataset.ExecuteSQL(extent_sql_statement)
+    if not layer:
+        raise ValueError(f"failed to run {extent_sql_statement}")
+    try:
+        min_x, max_x, min_y, max_y = layer.GetExtent(force=1)
+        spatial_ref = layer.GetSpatialRef()
+        projection = spatial_ref.ExportToWkt() if spatial_ref else ""
+        layer.ResetReading()
+        feature = layer.GetNextFeature()
+        fields = feature.items() if feature else {}
+    finally:
+        dataset.ReleaseResultSet(layer)
+        dataset = None
+    # matches the output size computation of gdal_rasterize
+    width = max(1, int(0.5 + (max_x - min_x) / resolution))
+    height = max(1, int(0.5 + (max_y - min_y) / resolution))
+    geo_transform = (min_x, resolution, 0.0, max_y, 0.0, -resolution)
+    return width, height, geo_transform, projection, fields
+
+
+def rasterize_tile(
+    source: str,
+    tile_sql_template: str,
+    key_field: str,
+    bound: RasterBound,
+    geo_transform: tuple,
+    projection: str,
+    query_fields: dict = None,
+) -> Tuple[RasterBound, np.ndarray, list]:
+    """Rasterize the geometry intersecting a tile of a raster grid into an
+    in-memory raster of the tile size, burning the position of each feature
+    in the tile query result.  The tile query is run once, and only reads
+    the features of the tile.
+
+    Args:
+        source (str): the gdal vector data source
+        tile_sql_template (str): the query selecting the geometry, the key
+            field, and a ``tile_index`` field numbering the features of the
+            tile from 1, with ``{xmin}``, ``{ymin}``, ``{xmax}`` and
+            ``{ymax}`` placeholders for the tile extent.  Features are
+            burned in the order of the result, so that where they overlap
+            the last one is burned as by gdal.Rasterize.
+        key_field (str): the field identifying each feature
+        bound (RasterBound): the tile in pixel coordinates of the grid
+        geo_transform (tuple): the grid geotransform
+        projection (str): the grid projection
+        query_fields (dict, optional): values of other placeholders of the
+            tile query template. Defaults to None.
+
+    Raises:
+        ValueError: the tile query failed
+
+    Returns:
+        Tuple[RasterBound, np.ndarray, list]: the tile bound, its pixels,
+            where 0 is not covered by any feature and i > 0 is covered by
+            the feature with tile_index i, and the key of each tile_index
+            from 1
+    """
+    ulx, xres, _, uly, _, yres = geo_transform
+    tile_ulx = ulx + bound.x_off * xres
+    tile_uly = uly + bound.y_off * yres
+    tile_lrx = ulx + (bound.x_off + bound.x_size) * xres
+    tile_lry = uly + (bound.y_off + bound.y_size) * yres
+    features = gdal.VectorTranslate(
+        "",
+        source,
+        options=gdal.VectorTranslateOptions(
+            format="Memory",
+            SQLStatement=tile_sql_template.format(
+                **(query_fields or {}),
+                xmin=repr(min(tile_ulx, tile_lrx)),
+                ymin=repr(min(tile_uly, tile_lry)),
+                xmax=repr(max(tile_ulx, tile_lrx)),
+                ymax=repr(max(tile_uly, tile_lry)),
+            ),
+            layerName="tile",
+        ),
+    )
+    if not features:
+        raise ValueError(f"failed to query tile {bound}")
+    keys = {}
+    for feature in features.GetLayer(0):
+        keys[feature.GetField("tile_index")] = feature.GetField(key_field)
+    tile = gdal.GetDriverByName("MEM").Create(
+        "", bound.x_size, bound.y_size, 1, gdal.GDT_Int32
+    )
+    tile.SetGeoTransform((tile_ulx, xres, 0.0, tile_uly, 0.0, yres))
+    tile.SetProjection(projection)
+    band = tile.GetRasterBand(1)
+    band.Fill(0)
+    gdal.Rasterize(
+        tile,
+        features,
+        options=gdal.RasterizeOptions(attribute="tile_index"),
+    )
+    data = band.ReadAsArray()
+    del band
+    tile = None
+    features = None
+    return bound, data, [keys[i] for i in range(1, len(keys) + 1)]
+
+
+def rasterize_tiled(
+    source: str,
+    extent_sql_statement: str,
+    tile_sql_template: str,
+    dest_path: str,
+    key_field: str,
+    key_values: pd.Series,
+    resolution: float,
+    nodata: int = -1,
+    data_type: int = gdal.GDT_Int32,
+    creation_options: list[str] = None,
+    tile_size: int = 4096,
+    workers: int = None,
+) -> None:
+    """Rasterize vector geometry to the same grid as gdal.Rasterize with the
+    specified resolution, by splitting the grid into tiles that are
+    rasterized concurrently by worker processes, each reading only the
+    geometry that intersects its tile.
+
+    The burned values are not computed by the tile queries, which would
+    repeat any inventory wide computation for every tile.  Instead each
+    feature is identified by a key, which is mapped to its value with
+    key_values as the tiles are written.  The tiles are written to the
+    output as they complete, so the output should be tiled with a block
+    size that divides tile_size.
+
+    Args:
+        source (str): the gdal vector data source, for example a PG
+            connection string
+        extent_sql_statement (str): the query computing the extent of all
+            rasterized geometry, see :py:func:`get_vector_grid`
+        tile_sql_template (str): the query selecting the geometry and key
+            of a tile, see :py:func:`rasterize_tile`.  The fields returned
+            by the extent query are available as placeholders, for example
+            to pass a spatial reference id computed once.
+        dest_path (str): path to the output GeoTIFF
+        key_field (str): the field identifying each feature
+        key_values (pd.Series): the burned value of each key, indexed by
+            unique keys. Features whose key is not defined are not burned.
+        resolution (float): the pixel size
+        nodata (int, optional): the output nodata value. Defaults to -1.
+        data_type (int, optional): the gdal data type. Defaults to
+            gdal.GDT_Int32.
+        creation_options (list[str], optional): the GeoTIFF creation options.
+            Defaults to None.
+        tile_size (int, optional): the tile width and height in pixels.
+            Defaults to 4096.
+        workers (int, optional): the number of worker processes. Defaults to
+            None, which uses the number of processors.
+
+    Raises:
+        ValueError: the keys of key_values are not unique
+    """
+    key_index = pd.Index(key_values.index)
+    if not key_index.is_unique:
+        duplicates = key_index[key_index.duplicated()].unique()
+        raise ValueError(
+            f"{len(duplicates)} keys are defined more than once, for "
+            f"example {list(duplicates[:5])}"
+        )
+    width, height, geo_transform, projection, query_fields = get_vector_grid(
+        source, extent_sql_statement, resolution
+    )
+    # position -1 of undefined keys gathers the appended nodata value
+    burn_values = np.append(key_values.to_numpy(), nodata)
+    output = gdal.GetDriverByName("GTiff").Create(
+        dest_path, width, height, 1, data_type, creation_options or []
+    )
+    output.SetGeoTransform(geo_transform)
+    output.SetProjection(projection)
+    band = output.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+    try:
+        bounds = list(
+            raster_chunks.get_raster_chunks(
+                width, height, tile_size, tile_size
+            )
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set(
+                executor.submit(
+                    rasterize_tile,
+                    source,
+                    tile_sql_template,
+                    key_field,
+                    bound,
+                    geo_transform,
+                    projection,
+                    query_fields,
+                )
+                for bound in bounds
+            )
+            while pending:
+                # write tiles as they complete so that only the tiles in
+                # flight are held in memory
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    bound, data, keys = future.result()
+                    tile_values = np.append(
+                        nodata, burn_values[key_index.get_indexer(keys)]
+                    )
+                    band.WriteArray(
+                        tile_values[data], bound.x_off, bound.y_off
+                    )
+    finally:
+        band.FlushCache()
+        del band
+        output = None
@@ -0,0 +1,146 @@
+import math
+from typing import Tuple
+from osgeo import gdal
+from osgeo import osr
+
+WGS84_SRS = "+proj=longlat +ellps=WGS84"
+
+
+def get_warp_grid(
+    src_path: str,
+    dst_srs: str = WGS84_SRS,
+    resolution: float = None,
+    align_origin: Tuple[float, float] = None,
+) -> Tuple[int, int, tuple, str]:
+    """Compute the output grid of a warp of the specified raster once, so
+    that it can be recorded, aligned and passed explicitly to gdal.Warp.
+
+    Without a resolution or alignment the grid is the one chosen by
+    gdal.Warp by default.
+
+    Args:
+        src_path (str): path to the source raster
+        dst_srs (str, optional): the target spatial reference in any format
+            accepted by osr.SpatialReference.SetFromUserInput. Defaults to
+            WGS84_SRS.
+        resolution (float, optional): the target pixel size in target
+            units. Defaults to None, which uses the resolution suggested by
+            gdal.
+        align_origin (Tuple[float, float], optional): an x, y coordinate of
+            a target grid, for example a GCBM tile corner, to which the
+            output pixel edges are snapped. The output extent is expanded
+            to whole pixels from this origin. Defaults to None, which does
+            not snap.
+
+    Raises:
+        ValueError: the source raster could not be opened
+
+    Returns:
+        Tuple[int, int, tuple, str]: the output width, height,
+            geotransform, and projection as wkt
+    """
+    srs = osr.SpatialReference()
+    srs.SetFromUserInput(dst_srs)
+    dst_wkt = srs.ExportToWkt()
+    src = gdal.Open(src_path)
+    if not src:
+        raise ValueError(f"failed to open '{src_path}'")
+    try:
+        vrt = gdal.AutoCreateWarpedVRT(
+            src, None, dst_wkt, gdal.GRA_NearestNeighbour
+        )
+        ulx, xres, _, uly, _, yres = vrt.GetGeoTransform()
+        lrx = ulx + vrt.RasterXSize * xres
+        lry = uly + vrt.RasterYSize * yres
+        vrt = None
+    finally:
+        src = None
+    if resolution is None and align_origin is None:
+        return (
+            int(round((lrx - ulx) / xres)),
+            int(round((lry - uly) / yres)),
+            (ulx, xres, 0.0, uly, 0.0, yres),
+            dst_wkt,
+        )
+
+    res = float(resolution) if resolution else abs(xres)
+    origin_x, origin_y = align_origin if align_origin else (ulx, uly)
+    min_x = origin_x + math.floor((ulx - origin_x) / res) * res
+    max_x = origin_x + math.ceil((lrx - origin_x) / res) * res
+    min_y = origin_y + math.floor((lry - origin_y) / res) * res
+    max_y = origin_y + math.ceil((uly - origin_y) / res) * res
+    return (
+        max(1, int(round((max_x - min_x) / res))),
+        max(1, int(round((max_y - min_y) / res))),
+        (min_x, res, 0.0, max_y, 0.0, -res),
+        dst_wkt,
+    )
+
+
+def warp(
+    src_path: str,
+    dest_path: str,
+    dst_srs: str = WGS84_SRS,
+    resolution: float = None,
+    align_origin: Tuple[float, float] = None,
+    warp_memory_mb: int = 512,
+    num_threads: str = "ALL_CPUS",
+    error_threshold: float = 0.125,
+    creation_options: list[str] = None,
+    data_type: int = gdal.GDT_Int32,
+) -> None:
+    """Warp a categorical raster with nearest neighbour resampling onto the
+    grid computed by :py:func:`get_warp_grid`.
+
+    The warp is processed in chunks whose size is limited by
+    warp_memory_mb, and each chunk is warped by several threads.  The
+    coordinate transformation is approximated by interpolation between
+    exactly transformed points, within error_threshold pixels.
+
+    Args:
+        src_path (str): path to the source raster
+        dest_path (str): path to the output GeoTIFF
+        dst_srs (str, optional): see :py:func:`get_warp_grid`. Defaults to
+            WGS84_SRS.
+        resolution (float, optional): see :py:func:`get_warp_grid`.
+            Defaults to None.
+        align_origin (Tuple[float, float], optional): see
+            :py:func:`get_warp_grid`. Defaults to None.
+        warp_memory_mb (int, optional): the warp working buffer size in
+            megabytes. Defaults to 512.
+        num_threads (str, optional): the number of warping threads, or
+            "ALL_CPUS". Defaults to "ALL_CPUS".
+        error_threshold (float, optional): the maximum error in pixels of
+            the approximate transformer, 0 uses the exact transformer.
+            Defaults to 0.125.
+        creation_options (list[str], optional): the GeoTIFF creation
+            options. Defaults to None.
+        data_type (int, optional): the output gdal data type. Defaults to
+            gdal.GDT_Int32.
+    """
+    width, height, geo_transform, projection = get_warp_grid(
+        src_path, dst_srs, resolution, align_origin
+    )
+    ulx, xres, _, uly, _, yres = geo_transform
+    gdal.Warp(
+        destNameOrDestDS=dest_path,
+        srcDSOrSrcDSTab=src_path,
+        options=gdal.WarpOptions(
+            dstSRS=projection,
+            outputBounds=(
+                ulx,
+                uly + height * yres,
+                ulx + width * xres,
+                uly,
+            ),
+            width=width,
+            height=height,
+            resampleAlg="near",
+            warpMemoryLimit=warp_memory_mb * 2**20,
+            multithread=True,
+            warpOptions=[f"NUM_THREADS={num_threads}"],
+            errorThreshold=error_threshold,
+            creationOptions=creation_options or [],
+            outputType=data_type,
+        ),
+    )
@@ -1,5 +1,6 @@
+from typing import Iterable
+from typing import Tuple
 import numpy as np
-from osgeo import gdal
 from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
 from nifd_casfri_preprocessing.gis_helpers import raster_chunks
 
@@ -50,14 +51,49 @@ def compute_areas(y_res, y_size, origin_y):
     return area_vector
 
 
+def _get_area_vector(src_path, scale_factor=1.0):
+    origin_x, xres, x_skew, origin_y, y_skew, yres = (
+        gdal_helpers.get_raster_geo_transform(src_path)
+    )
+    if x_skew != 0 or y_skew != 0:
+        raise ValueError("raster must be North up")
+    y_size = gdal_helpers.get_raster_dimension(src_path).y_size
+    return compute_areas(yres, y_size, origin_y) * scale_factor
+
+
+def _get_chunks(path, n_rasters, memory_limit_mb, bytes_per_pixel=4):
+    bounds = gdal_helpers.get_raster_dimension(path)
+    if memory_limit_mb is None:
+        return [bounds]
+    block_x_size, block_y_size = gdal_helpers.get_raster_block_size(path)
+    return list(
+        raster_chunks.get_block_aligned_raster_chunks(
+            n_rasters=n_rasters,
+            width=bounds.x_size,
+            height=bounds.y_size,
+            block_width=block_x_size,
+            block_height=block_y_size,
+            memory_limit_MB=memory_limit_mb,
+            bytes_per_pixel=bytes_per_pixel,
+        )
+    )
+
+
 def create_wgs84_area_raster(
-    src_path, out_path, scale_factor=1.0, max_chunk_size=5000 * 5000
+    src_path,
+    out_path,
+    scale_factor=1.0,
+    max_chunk_size=5000 * 5000,
+    raster_profile=None,
 ):
     """Create a geotiff file whose value is area based on the specified
     projected src_path.  The output raster assumes the input raster's
     projection, resolution and dimension. The raster at src_path is assumed
     to be wgs84 and North up.
 
+    The output is written through a single open dataset in chunks aligned
+    to its blocks, so that each block is compressed once.
+
     Args:
         src_path (str): path to a wgs84 raster
         out_path (str): path to the output area raster
@@ -67,41 +103,135 @@ def create_wgs84_area_raster(
             0.0001. Defaults to 1.0.
         max_chunk_size (int, optional): The maximum number of pixels to store
             in memory when writing the output buffer. Defaults to 2.5e7.
+        raster_profile (str, optional): the output raster profile, see
+            :py:func:`gdal_helpers.get_raster_profile`. Defaults to None.
 
     Raises:
         ValueError: The raster at the specified src_path is not a North up
             raster.
     """
-    src = gdal.Open(src_path)
-    origin_x, xres, x_skew, origin_y, y_skew, yres = src.GetGeoTransform()
-    if x_skew != 0 or y_skew != 0:
-        raise ValueError("raster must be North up")
-    y_size = src.RasterYSize
-    x_size = src.RasterXSize
-    area_vector = compute_areas(yres, y_size, origin_y)
-
-    if max_chunk_size < y_size:
-        max_chunk_size = y_size
-
-    chunks = raster_chunks.get_raster_chunks(
-        width=x_size,
-        height=y_size,
-        chunk_width=max_chunk_size / area_vector.shape[0],
-        chunk_height=y_size,
-    )
-    gdal_helpers.create_empty_raster(
+    area_vector = _get_area_vector(src_path, scale_factor).astype(np.float32)
+    with gdal_helpers.create_rasters(
         src_path,
-        out_path,
+        [out_path],
         data_type=np.float32,
         nodata=-1.0,
         driver_name="GTiff",
-        options=gdal_helpers.get_default_geotiff_creation_options(),
-    )
-    area_vector_col = area_vector.reshape((y_size, 1)) * scale_factor
+        options=gdal_helpers.get_default_geotiff_creation_options(
+            np.float32, raster_profile
+        ),
+    ) as out_datasets:
+        out_dataset = out_datasets[out_path]
+        band = out_dataset.GetRasterBand(1)
+        block_x_size, block_y_size = band.GetBlockSize()
+        del band
+        chunks = raster_chunks.get_block_aligned_raster_chunks(
+            n_rasters=1,
+            width=out_dataset.RasterXSize,
+            height=out_dataset.RasterYSize,
+            block_width=block_x_size,
+            block_height=block_y_size,
+            memory_limit_MB=max_chunk_size * 4 / 1e6,
+        )
+        for chunk in chunks:
+            rows = area_vector[slice(chunk.y_off, chunk.y_off + chunk.y_size)]
+            gdal_helpers.write_dataset_output(
+                out_dataset,
+                data=np.ascontiguousarray(
+                    np.broadcast_to(
+                        rows.reshape((chunk.y_size, 1)),
+                        (chunk.y_size, chunk.x_size),
+                    )
+                ),
+                x_off=chunk.x_off,
+                y_off=chunk.y_off,
+            )
+    gdal_helpers.build_overviews(out_path, raster_profile, "AVERAGE")
+
+
+def _add_totals(totals: np.ndarray, chunk_totals: np.ndarray) -> np.ndarray:
+    if chunk_totals.shape[0] > totals.shape[0]:
+        chunk_totals[: totals.shape[0]] += totals
+        return chunk_totals
+    totals[: chunk_totals.shape[0]] += chunk_totals
+    return totals
+
+
+def get_value_totals(
+    chunks: Iterable[gdal_helpers.GDALHelperDataset],
+    row_weights: np.ndarray = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Count the pixels of each value of an integer raster read in chunks,
+    and optionally sum a weight of each pixel that depends on its row, such
+    as the pixel areas of a wgs84 raster.  Only one chunk is held in memory
+    at a time.
+
+    Args:
+        chunks (Iterable[gdal_helpers.GDALHelperDataset]): the chunks of the
+            raster, for example as read by a RasterChunkReader
+        row_weights (np.ndarray, optional): the weight of a pixel in each
+            row of the raster. Defaults to None.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: the pixel count and the weight sum
+            of each raster value, indexed by value.  The weight sums are
+            None if row_weights is not specified.  Negative values and the
+            nodata value are excluded.
+    """
+    counts = np.zeros(0, dtype="int64")
+    weights = None if row_weights is None else np.zeros(0, dtype="float64")
     for chunk in chunks:
-        gdal_helpers.write_output(
-            out_path,
-            data=np.repeat(area_vector_col, chunk.x_size, axis=1),
-            x_off=chunk.x_off,
-            y_off=0,
+        valid = chunk.data >= 0
+        if chunk.nodata is not None:
+            valid &= chunk.data != chunk.nodata
+        values = chunk.data[valid]
+        counts = _add_totals(counts, np.bincount(values))
+        if row_weights is not None:
+            bounds = chunk.data_bounds
+            rows = row_weights[
+                slice(bounds.y_off, bounds.y_off + bounds.y_size)
+            ]
+            weights = _add_totals(
+                weights,
+                np.bincount(
+                    values,
+                    weights=np.broadcast_to(
+                        rows.reshape((bounds.y_size, 1)), chunk.data.shape
+                    )[valid],
+                ),
+            )
+    return counts, weights
+
+
+def get_area_weighted_totals(
+    raster_path, scale_factor=1.0, memory_limit_mb=None
+):
+    """Compute the total area of each value of a wgs84 raster, for example
+    the area of each raster_id of cas_id_wgs84.tiff, without creating an
+    area raster.  The area of each pixel is the area of its row computed by
+    :py:func:`compute_areas`.
+
+    Args:
+        raster_path (str): path to a wgs84, North up, integer raster
+        scale_factor (float, optional): Conversion factor applied to the
+            areas, which are in m^2 by default. Defaults to 1.0.
+        memory_limit_mb (int, optional): approximate memory limit for the
+            raster chunks. If not specified the raster is read in a single
+            chunk. Defaults to None.
+
+    Raises:
+        ValueError: The raster at the specified raster_path is not a North
+            up raster.
+
+    Returns:
+        numpy.ndarray: the area of each raster value, indexed by value.
+            Negative values and the nodata value are excluded.
+    """
+    with gdal_helpers.raster_session():
+        area_vector = _get_area_vector(raster_path, scale_factor)
+        chunks = _get_chunks(raster_path, 4, memory_limit_mb, 8)
+        _, totals = get_value_totals(
+            (gdal_helpers.read_dataset(raster_path, c) for c in chunks),
+            area_vector,
         )
+    return totals
@@ -0,0 +1,135 @@
+from typing import Any
+from typing import Callable
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+from nifd_casfri_preprocessing import log_helper
+
+logger = log_helper.get_logger()
+
+
+class Job:
+    """A unit of work run by :py:func:`run_jobs`
+
+    Args:
+        name (str): unique name of the job
+        func (Callable): picklable function run in a worker process
+        args (tuple, optional): positional arguments for func.
+        kwargs (dict, optional): keyword arguments for func.
+        depends_on (list[str], optional): names of jobs that must complete
+            successfully before this job starts.
+        resource (str, optional): name of the resource class whose
+            concurrency limit applies to this job. Defaults to "cpu".
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        args: tuple = (),
+        kwargs: dict[str, Any] = None,
+        depends_on: list[str] = None,
+        resource: str = "cpu",
+    ):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs if kwargs else {}
+        self.depends_on = depends_on if depends_on else []
+        self.resource = resource
+
+
+def _validate(jobs: list[Job], resource_limits: dict[str, int]) -> None:
+    names = set()
+    for job in jobs:
+        if job.name in names:
+            raise ValueError(f"duplicate job name '{job.name}'")
+        names.add(job.name)
+    for job in jobs:
+        if job.resource not in resource_limits:
+            raise ValueError(
+                f"job '{job.name}' resource '{job.resource}' has no "
+                "concurrency limit"
+            )
+        for dependency in job.depends_on:
+            if dependency not in names:
+                raise ValueError(
+                    f"job '{job.name}' depends on undefined job "
+                    f"'{dependency}'"
+                )
+
+    # check for cycles by repeatedly removing jobs with satisfied
+    # dependencies
+    remaining = {job.name: set(job.depends_on) for job in jobs}
+    while remaining:
+        ready = [k for k, v in remaining.items() if not v]
+        if not ready:
+            raise ValueError(
+                f"job dependencies contain a cycle: {sorted(remaining)}"
+            )
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+
+
+def run_jobs(
+    jobs: list[Job], resource_limits: dict[str, int]
+) -> dict[str, bool]:
+    """Run the specified jobs as a dependency graph.  Each job starts as soon
+    as all of its dependencies have succeeded, subject to the concurrency
+    limit of its resource class, so jobs using different resource classes
+    overlap.  Jobs whose dependencies fail are not run.
+
+    Args:
+        jobs (list[Job]): the jobs to run
+        resource_limits (dict[str, int]): the maximum number of concurrently
+            running jobs for each resource class
+
+    Raises:
+        ValueError: the jobs are not a valid dependency graph
+
+    Returns:
+        dict[str, bool]: the success status of each job by name
+    """
+    _validate(jobs, resource_limits)
+    executors = {
+        resource: ProcessPoolExecutor(max_workers=limit)
+        for resource, limit in resource_limits.items()
+    }
+    pending = list(jobs)
+    running: dict[Future, Job] = {}
+    status: dict[str, bool] = {}
+    try:
+        while pending or running:
+            for job in list(pending):
+                if any(status.get(d) is False for d in job.depends_on):
+                    logger.error(
+                        f"skipping job '{job.name}': a dependency failed"
+                    )
+                    status[job.name] = False
+                    pending.remove(job)
+                elif all(status.get(d) for d in job.depends_on):
+                    logger.info(f"starting job '{job.name}'")
+                    future = executors[job.resource].submit(
+                        job.func, *job.args, **job.kwargs
+                    )
+                    running[future] = job
+                    pending.remove(job)
+            if not running:
+                continue
+            done, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    future.result()
+                    logger.info(f"finished job '{job.name}'")
+                    status[job.name] = True
+                except Exception:
+                    logger.exception(f"job '{job.name}' failed")
+                    status[job.name] = False
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+    return status
@@ -1,21 +1,133 @@
 import os
+import copy
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+from typing import Iterator
 import numpy as np
 import pandas as pd
 from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
+from nifd_casfri_preprocessing.gis_helpers import raster_chunks
+from nifd_casfri_preprocessing.gis_helpers.raster_bound import RasterBound
 from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing import raster_lookup
+from nifd_casfri_preprocessing import stage_cache
 from nifd_casfri_preprocessing import log_helper
 
 logger = log_helper.get_logger()
 
 
+# the number of full-size int32 arrays held per chunk while mapping it to
+# an output: the raster_id chunk, the valid pixel mask and gather index, and
+# the mapped output
+_CHUNK_ARRAY_COUNT = 4
+
+
+class RasterChunkReader:
+    """Reads a raster in chunks.  If no memory limit is specified the
+    entire raster is read as a single chunk, otherwise the raster is read in
+    memory limited chunks aligned to its block size.
+
+    Instances are small and picklable so that they can be sent to worker
+    processes.  If a cache_path to a file created by
+    :py:func:`gdal_helpers.write_raster_cache` is specified, chunks are read
+    from the memory-mapped cache rather than decoded from the raster.
+
+    Args:
+        path (str): path to the raster
+        memory_limit_mb (int, optional): approximate memory limit for the
+            chunks. Defaults to None.
+        cache_path (str, optional): path to a .npy cache of the raster.
+            Defaults to None.
+    """
+
+    def __init__(
+        self, path: str, memory_limit_mb: int = None, cache_path: str = None
+    ):
+        self.path = path
+        self.cache_path = cache_path
+        # the raster is opened once for all of its metadata
+        with gdal_helpers.raster_session():
+            self._raster_bounds = gdal_helpers.get_raster_dimension(path)
+            self._nodata = gdal_helpers.get_raster_no_data(path)
+            self._geo_transform = gdal_helpers.get_raster_geo_transform(path)
+            self._projection = gdal_helpers.get_raster_projection(path)
+            if memory_limit_mb is None:
+                self._chunks = [self._raster_bounds]
+            else:
+                block_x_size, block_y_size = (
+                    gdal_helpers.get_raster_block_size(path)
+                )
+                self._chunks = list(
+                    raster_chunks.get_block_aligned_raster_chunks(
+                        n_rasters=_CHUNK_ARRAY_COUNT,
+                        width=self._raster_bounds.x_size,
+                        height=self._raster_bounds.y_size,
+                        block_width=block_x_size,
+                        block_height=block_y_size,
+                        memory_limit_MB=memory_limit_mb,
+                    )
+                )
+
+    @property
+    def chunks(self) -> list[RasterBound]:
+        return self._chunks
+
+    def with_cache(self, cache_path: str) -> "RasterChunkReader":
+        """Write a cache of the raster to the specified path, and return a
+        copy of this reader that reads from it.
+        """
+        gdal_helpers.write_raster_cache(self.path, cache_path, self._chunks)
+        reader = copy.copy(self)
+        reader.cache_path = cache_path
+        return reader
+
+    def __iter__(self) -> Iterator[gdal_helpers.GDALHelperDataset]:
+        if self.cache_path is None:
+            for chunk in self._chunks:
+                yield gdal_helpers.read_dataset(self.path, chunk)
+            return
+        cache = np.load(self.cache_path, mmap_mode="r")
+        for chunk in self._chunks:
+            yield gdal_helpers.GDALHelperDataset(
+                path=self.path,
+                data=cache[
+                    slice(chunk.y_off, chunk.y_off + chunk.y_size),
+                    slice(chunk.x_off, chunk.x_off + chunk.x_size),
+                ],
+                data_bounds=chunk,
+                raster_bounds=self._raster_bounds,
+                nodata=self._nodata,
+                geo_transform=self._geo_transform,
+                projection=self._projection,
+            )
+
+
 class ParquetGeoDataset:
-    def __init__(self, data_dir: str, wgs84: bool):
-        self._data_dict: dict[str, pd.DataFrame] = casfri_data.load_parquet(
-            data_dir
-        )
+    def __init__(
+        self, data_dir: str, wgs84: bool, memory_limit_mb: int = None
+    ):
+        self._data_dict: dict[str, pd.DataFrame] = {}
+        self._cas_id_dtype: pd.CategoricalDtype = None
         raster_filename = "cas_id_wgs84.tiff" if wgs84 else "cas_id.tiff"
+        self._data_dir = data_dir
+        self._wgs84 = wgs84
         self._base_raster_path = os.path.join(data_dir, raster_filename)
-        self._raster = gdal_helpers.read_dataset(self.base_raster_path)
+        self._memory_limit_mb = memory_limit_mb
+        self._raster: gdal_helpers.GDALHelperDataset = None
+
+    @property
+    def data_dir(self) -> str:
+        return self._data_dir
+
+    @property
+    def wgs84(self) -> bool:
+        return self._wgs84
+
+    @property
+    def memory_limit_mb(self) -> int:
+        return self._memory_limit_mb
 
     @property
     def base_raster_path(self) -> str:
@@ -23,35 +135,72 @@ class ParquetGeoDataset:
 
     @property
     def raster(self) -> gdal_helpers.GDALHelperDataset:
+        if self._raster is None:
+            # the pixels are read on the first access of raster.data
+            self._raster = gdal_helpers.open_dataset(self.base_raster_path)
         return self._raster
 
+    def get_raster_reader(self) -> RasterChunkReader:
+        return RasterChunkReader(self.base_raster_path, self._memory_limit_mb)
+
+    def get_table(
+        self, name: str, columns: list[str] = None, layer: int = None
+    ) -> pd.DataFrame:
+        """Read the specified columns of a table, optionally only the rows
+        of the specified layer.  The result is not cached.
+
+        Args:
+            name (str): the table name
+            columns (list[str], optional): the columns to read. If not
+                specified all columns are read.
+            layer (int, optional): if specified only rows whose layer
+                column is equal to this value are read.
+
+        Returns:
+            pd.DataFrame: the table data
+        """
+        if self._cas_id_dtype is None:
+            self._cas_id_dtype = casfri_data.get_cas_id_dtype(self._data_dir)
+        return casfri_data.read_table(
+            self._data_dir,
+            name,
+            columns=columns,
+            filters=[("layer", "==", layer)] if layer is not None else None,
+            cas_id_dtype=self._cas_id_dtype,
+        )
+
+    def _get_cached_table(self, name: str) -> pd.DataFrame:
+        if name not in self._data_dict:
+            self._data_dict[name] = self.get_table(name)
+        return self._data_dict[name]
+
     @property
     def hdr(self) -> pd.DataFrame:
-        return self._data_dict["hdr"]
+        return self._get_cached_table("hdr")
 
     @property
     def cas(self) -> pd.DataFrame:
-        return self._data_dict["cas"]
+        return self._get_cached_table("cas")
 
     @property
     def eco(self) -> pd.DataFrame:
-        return self._data_dict["eco"]
+        return self._get_cached_table("eco")
 
     @property
     def lyr(self) -> pd.DataFrame:
-        return self._data_dict["lyr"]
+        return self._get_cached_table("lyr")
 
     @property
     def nfl(self) -> pd.DataFrame:
-        return self._data_dict["nfl"]
+        return self._get_cached_table("nfl")
 
     @property
     def dst(self) -> pd.DataFrame:
-        return self._data_dict["dst"]
+        return self._get_cached_table("dst")
 
     @property
     def geo_lookup(self) -> pd.DataFrame:
-        return self._data_dict["geo_lookup"]
+        return self._get_cached_table("geo_lookup")
 
 
 def get_layer_subdir(layer_id: int) -> str:
@@ -59,8 +208,8 @@ def get_layer_subdir(layer_id: int) -> str:
 
 
 def create_layer_index(ds: ParquetGeoDataset, out_dir: str) -> pd.DataFrame:
-    lyr_layer_ids = set(list(ds.lyr["layer"].unique()))
-    dst_layer_ids = set(list(ds.dst["layer"].unique()))
+    lyr_layer_ids = set(list(ds.get_table("lyr", ["layer"])["layer"].unique()))
+    dst_layer_ids = set(list(ds.get_table("dst", ["layer"])["layer"].unique()))
     all_layer_ids = lyr_layer_ids.union(dst_layer_ids)
     layer_index = []
     for _id in all_layer_ids:
@@ -88,12 +237,56 @@ def create_layer_index(ds: ParquetGeoDataset, out_dir: str) -> pd.DataFrame:
     return df
 
 
+def write_lookup_rasters(
+    reader: RasterChunkReader,
+    lookups: dict[str, np.ndarray],
+    raster_profile: str = None,
+) -> None:
+    """Create every output raster in the specified lookups at once, then
+    map each chunk of the base raster to all outputs and write it, so that
+    the base raster is decoded only once and each output is written
+    sequentially in a single pass.
+
+    Args:
+        reader (RasterChunkReader): reader for the base raster to map
+        lookups (dict[str, np.ndarray]): raster_id lookup arrays keyed by
+            output raster path
+        raster_profile (str, optional): the output raster profile, see
+            :py:func:`gdal_helpers.get_raster_profile`. Defaults to None.
+    """
+    if not lookups:
+        return
+    # the base raster is opened once for all of its chunks
+    with gdal_helpers.raster_session():
+        with gdal_helpers.create_rasters(
+            reader.path,
+            list(lookups.keys()),
+            data_type=np.int32,
+            nodata=-1,
+            options=gdal_helpers.get_default_geotiff_creation_options(
+                np.int32, raster_profile
+            ),
+        ) as out_datasets:
+            for chunk in reader:
+                for out_path, lookup in lookups.items():
+                    gdal_helpers.write_dataset_output(
+                        out_datasets[out_path],
+                        raster_lookup.apply_lookup(
+                            lookup, chunk.data, chunk.nodata
+                        ),
+                        x_off=chunk.data_bounds.x_off,
+                        y_off=chunk.data_bounds.y_off,
+                    )
+        for out_path in lookups.keys():
+            gdal_helpers.build_overviews(out_path, raster_profile)
+
+
 def process_origin(
     layer_id: int, ds: ParquetGeoDataset, out_dir: str, age_relative_year: int
-) -> None:
-    mean_origin_view = ds.lyr.loc[ds.lyr["layer"] == layer_id][
-        ["cas_id", "origin_upper", "origin_lower"]
-    ].copy()
+) -> dict[str, np.ndarray]:
+    mean_origin_view = ds.get_table(
+        "lyr", ["cas_id", "origin_upper", "origin_lower"], layer=layer_id
+    )
     mean_origin_view = ds.geo_lookup.merge(
         mean_origin_view, left_on="cas_id", right_on="cas_id"
     )
@@ -115,54 +308,43 @@ def process_origin(
         .astype("int")
     )
 
-    out_data = pd.DataFrame(
-        columns=["raster_id"], data=ds.raster.data.flatten()
-    )
-    out_data = out_data.merge(
-        mean_origin_view[["raster_id", "mean_origin"]], how="left"
-    )
-    out_data_np = out_data["mean_origin"].fillna(-1).to_numpy()
-    out_mean_origin_path = os.path.join(out_dir, "mean_origin.tiff")
-    gdal_helpers.create_empty_raster(
-        ds.base_raster_path,
-        out_mean_origin_path,
-        data_type=np.int32,
-        nodata=-1,
-        options=gdal_helpers.get_default_geotiff_creation_options(),
+    lookup_size = raster_lookup.get_lookup_size(ds.geo_lookup)
+    mean_origin_lookup = raster_lookup.create_lookup(
+        mean_origin_view["raster_id"].to_numpy(),
+        mean_origin_view["mean_origin"].to_numpy(),
+        lookup_size,
     )
-    gdal_helpers.write_output(
-        out_mean_origin_path,
-        out_data_np.reshape(ds.raster.data.shape),
-        x_off=0,
-        y_off=0,
-    )
-
-    out_age_path = os.path.join(out_dir, f"age_{age_relative_year}.tiff")
-    gdal_helpers.create_empty_raster(
-        ds.base_raster_path,
-        out_age_path,
-        data_type=np.int32,
-        nodata=-1,
-        options=gdal_helpers.get_default_geotiff_creation_options(),
-    )
-    out_age_data = out_data_np.copy()
-    out_age_data[out_age_data > 0] = (
-        age_relative_year - out_age_data[out_age_data > 0]
-    )
-    gdal_helpers.write_output(
-        out_age_path,
-        out_age_data.reshape(ds.raster.data.shape),
-        x_off=0,
-        y_off=0,
+    age_lookup = np.where(
+        mean_origin_lookup > 0,
+        age_relative_year - mean_origin_lookup,
+        mean_origin_lookup,
+    ).astype(np.int32)
+    return {
+        os.path.join(out_dir, "mean_origin.tiff"): mean_origin_lookup,
+        os.path.join(out_dir, f"age_{age_relative_year}.tiff"): age_lookup,
+    }
+
+
+def get_age_lookup(
+    age_relative_year: int, max_origin_year: int = 9999
+) -> np.ndarray:
+    """Get a lookup array, indexed by mean origin year, of the age relative
+    to the specified year.  Used to derive an age raster directly from a
+    mean origin raster.
+    """
+    lookup = (age_relative_year - np.arange(max_origin_year + 1)).astype(
+        np.int32
     )
+    lookup[0] = -1
+    return lookup
 
 
 def process_leading_species(
     layer_id: int, ds: ParquetGeoDataset, out_dir: str
-) -> None:
-    leading_species_view = ds.lyr[ds.lyr.layer == 1][
-        ["cas_id", "species_1"]
-    ].copy()
+) -> dict[str, np.ndarray]:
+    leading_species_view = ds.get_table(
+        "lyr", ["cas_id", "species_1"], layer=1
+    )
     leading_species_view = ds.geo_lookup.merge(leading_species_view)
     leading_species_view_unique = (
         leading_species_view[["species_1"]]
@@ -175,40 +357,43 @@ def process_leading_species(
     leading_species_view = leading_species_view.merge(
         leading_species_view_unique
     )
-    leading_species_raster_data = (
-        pd.DataFrame({"raster_id": ds.raster.data.flatten()})
-        .merge(leading_species_view[["raster_id", "species_id"]], how="left")
-        .fillna(-1)["species_id"]
-        .astype("int32")
-        .to_numpy()
-        .reshape(ds.raster.data.shape)
+    leading_species_lookup = raster_lookup.create_lookup(
+        leading_species_view["raster_id"].to_numpy(),
+        leading_species_view["species_id"].to_numpy(),
+        raster_lookup.get_lookup_size(ds.geo_lookup),
     )
 
     out_leading_species_path = os.path.join(out_dir, "leading_species.tiff")
     out_leading_att_path = os.path.join(out_dir, "leading_species.csv")
-    gdal_helpers.create_empty_raster(
-        ds.base_raster_path,
-        out_leading_species_path,
-        data_type=np.int32,
-        nodata=-1,
-        options=gdal_helpers.get_default_geotiff_creation_options(),
-    )
-    gdal_helpers.write_output(
-        out_leading_species_path, leading_species_raster_data, x_off=0, y_off=0
-    )
     leading_species_view_unique.to_csv(
         out_leading_att_path,
         header=["raster_id", "casfri_species_name"],
         index=False,
     )
+    return {out_leading_species_path: leading_species_lookup}
 
 
 def process_disturbance_events(
     layer_id: int, ds: ParquetGeoDataset, out_dir: str
-) -> None:
+) -> dict[str, np.ndarray]:
 
+    lookups = {}
+    lookup_size = raster_lookup.get_lookup_size(ds.geo_lookup)
+    dist_cols = []
     for disturbance_col_num in range(1, 4):
-        dist_view = ds.dst[ds.dst["layer"] == layer_id].copy()
+        dist_cols.extend(
+            [
+                f"dist_type_{disturbance_col_num}",
+                f"dist_year_{disturbance_col_num}",
+                f"dist_ext_upper_{disturbance_col_num}",
+                f"dist_ext_lower_{disturbance_col_num}",
+            ]
+        )
+    layer_dist_view = ds.get_table(
+        "dst", ["cas_id"] + dist_cols, layer=layer_id
+    )
+    for disturbance_col_num in range(1, 4):
+        dist_view = layer_dist_view
         data_cols = [
             f"dist_type_{disturbance_col_num}",
             f"dist_year_{disturbance_col_num}",
@@ -226,13 +411,10 @@ def process_disturbance_events(
             dist_view_unique, left_on=data_cols, right_on=data_cols
         )
         dist_view = dist_view.merge(ds.geo_lookup)
-        disturbance_raster_data = (
-            pd.DataFrame({"raster_id": ds.raster.data.flatten()})
-            .merge(dist_view[["raster_id", "disturbance_id"]], how="left")
-            .fillna(-1)["disturbance_id"]
-            .astype("int32")
-            .to_numpy()
-            .reshape(ds.raster.data.shape)
+        disturbance_lookup = raster_lookup.create_lookup(
+            dist_view["raster_id"].to_numpy(),
+            dist_view["disturbance_id"].to_numpy(),
+            lookup_size,
         )
         out_disturbances_path = os.path.join(
             out_dir, f"disturbances_{disturbance_col_num}.tiff"
@@ -240,16 +422,7 @@ def process_disturbance_events(
         out_disturbances_att_path = os.path.join(
             out_dir, f"disturbances_{disturbance_col_num}.csv"
         )
-        gdal_helpers.create_empty_raster(
-            ds.base_raster_path,
-            out_disturbances_path,
-            data_type=np.int32,
-            nodata=-1,
-            options=gdal_helpers.get_default_geotiff_creation_options(),
-        )
-        gdal_helpers.write_output(
-            out_disturbances_path, disturbance_raster_data, x_off=0, y_off=0
-        )
+        lookups[out_disturbances_path] = disturbance_lookup
 
         dist_view_unique.to_csv(
             out_disturbances_att_path,
@@ -262,19 +435,20 @@ def process_disturbance_events(
             ],
             index=False,
         )
+    return lookups
 
 
 def process_species_components(
     layer_id: int, ds: ParquetGeoDataset, out_dir: str
-) -> None:
+) -> dict[str, np.ndarray]:
 
     species_cols = []
     for x in range(1, 11):
         species_cols.extend([f"species_{x}", f"species_per_{x}"])
 
-    species_view = ds.lyr[ds.lyr["layer"] == layer_id][
-        ["cas_id"] + species_cols
-    ].copy()
+    species_view = ds.get_table(
+        "lyr", ["cas_id"] + species_cols, layer=layer_id
+    )
 
     keep_cols = species_cols.copy()
     # drop from the above species cols where nothing is defined
@@ -305,15 +479,10 @@ def process_species_components(
 
     species_view = species_view.merge(species_view_unique)
     species_view = ds.geo_lookup.merge(species_view)
-    species_composition_raster_data = (
-        pd.DataFrame({"raster_id": ds.raster.data.flatten()})
-        .merge(
-            species_view[["raster_id", "species_composition_id"]], how="left"
-        )
-        .fillna(-1)["species_composition_id"]
-        .astype("int32")
-        .to_numpy()
-        .reshape(ds.raster.data.shape)
+    species_composition_lookup = raster_lookup.create_lookup(
+        species_view["raster_id"].to_numpy(),
+        species_view["species_composition_id"].to_numpy(),
+        raster_lookup.get_lookup_size(ds.geo_lookup),
     )
     out_species_composition_path = os.path.join(
         out_dir, "species_composition.tiff"
@@ -321,32 +490,38 @@ def process_species_components(
     out_species_composition_att_path = os.path.join(
         out_dir, "species_composition.csv"
     )
-    gdal_helpers.create_empty_raster(
-        ds.base_raster_path,
-        out_species_composition_path,
-        data_type=np.int32,
-        nodata=-1,
-        options=gdal_helpers.get_default_geotiff_creation_options(),
-    )
-    gdal_helpers.write_output(
-        out_species_composition_path,
-        species_composition_raster_data,
-        x_off=0,
-        y_off=0,
-    )
-
     species_view_unique.to_csv(
         out_species_composition_att_path,
         header=["raster_id"] + species_cols,
         index=False,
     )
+    return {out_species_composition_path: species_composition_lookup}
 
 
 def process(
-    data_dir: str, wgs84: bool, age_relative_year: int, out_dir: str
+    data_dir: str,
+    wgs84: bool,
+    age_relative_year: int,
+    out_dir: str,
+    memory_limit_mb: int = None,
+    workers: int = None,
+    use_cache: bool = True,
+    raster_profile: str = None,
+    wgs84_resolution: float = None,
+    wgs84_align_origin: tuple[float, float] = None,
+    warp_memory_mb: int = 512,
 ) -> None:
+    if wgs84:
+        casfri_data.create_wgs84_raster(
+            data_dir,
+            resolution=wgs84_resolution,
+            align_origin=wgs84_align_origin,
+            warp_memory_mb=warp_memory_mb,
+            raster_profile=raster_profile,
+            use_cache=use_cache,
+        )
     logger.info(f"loading dataset from {data_dir}")
-    ds = ParquetGeoDataset(data_dir, wgs84)
+    ds = ParquetGeoDataset(data_dir, wgs84, memory_limit_mb)
 
     layer_index = create_layer_index(ds, out_dir)
     lyr_layer_ids = [
@@ -357,15 +532,252 @@ def process(
         int(x)
         for x in layer_index[layer_index["defined_in_dst"]]["casfri_layer_id"]
     ]
-    for layer_id in lyr_layer_ids:
-        layer_subdir = os.path.join(out_dir, get_layer_subdir(layer_id))
-        logger.info("process origin data")
-        process_origin(layer_id, ds, layer_subdir, age_relative_year)
-        logger.info("process leading species data")
-        process_leading_species(layer_id, ds, layer_subdir)
-        logger.info("process species components data")
-        process_species_components(layer_id, ds, layer_subdir)
-    for layer_id in dst_layer_ids:
-        layer_subdir = os.path.join(out_dir, get_layer_subdir(layer_id))
-        logger.info("process disturbance events data")
-        process_disturbance_events(layer_id, ds, layer_subdir)
+    manifest = stage_cache.StageManifest(out_dir)
+
+    def complete(stages: list[tuple]) -> None:
+        # without the cache the inputs are not fingerprinted, so entries
+        # for the rewritten outputs are removed rather than recorded
+        for stage in stages:
+            if use_cache:
+                manifest.record(*stage)
+            else:
+                manifest.invalidate(stage[0])
+
+    reader = ds.get_raster_reader()
+    if workers and workers > 1:
+        # each worker compresses its own output, so the compression threads
+        # are divided between the workers rather than each using every cpu.
+        # The stage fingerprints use the original profile, since the thread
+        # count does not change the output.
+        worker_profile = copy.copy(
+            gdal_helpers.get_raster_profile(raster_profile)
+        )
+        if worker_profile.num_threads:
+            worker_profile.num_threads = str(
+                max(1, (os.cpu_count() or 1) // workers)
+            )
+        with tempfile.TemporaryDirectory(dir=out_dir) as temp_dir:
+            logger.info("caching base raster for worker processes")
+            reader = reader.with_cache(os.path.join(temp_dir, "raster.npy"))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # the pending futures by task, and the stages of each task,
+                # which are recorded as soon as all of its outputs are
+                # written so that a failure in one task does not discard
+                # the others
+                pending = {}
+                task_stages = {}
+                errors = []
+
+                def collect(timeout: float = None) -> None:
+                    done, _ = wait(
+                        list(pending),
+                        timeout=timeout,
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        task = pending.pop(future)
+                        if future.exception() is not None:
+                            errors.append(future.exception())
+                            task_stages.pop(task, None)
+                        elif task not in pending.values():
+                            # the stages of a failed task are discarded
+                            if task in task_stages:
+                                complete(task_stages.pop(task))
+
+                for task, (task_reader, lookups, stages) in enumerate(
+                    _iter_layer_tasks(
+                        ds,
+                        reader,
+                        manifest if use_cache else None,
+                        out_dir,
+                        lyr_layer_ids,
+                        dst_layer_ids,
+                        age_relative_year,
+                        raster_profile,
+                    )
+                ):
+                    task_stages[task] = stages
+                    # one task per output raster: each output is written by
+                    # a single worker in the same chunk order as a serial run
+                    for out_path, lookup in lookups.items():
+                        future = pool.submit(
+                            write_lookup_rasters,
+                            task_reader,
+                            {out_path: lookup},
+                            worker_profile,
+                        )
+                        pending[future] = task
+                    collect(timeout=0)
+                while pending:
+                    collect()
+                if errors:
+                    raise errors[0]
+    else:
+        for task_reader, lookups, stages in _iter_layer_tasks(
+            ds,
+            reader,
+            manifest if use_cache else None,
+            out_dir,
+            lyr_layer_ids,
+            dst_layer_ids,
+            age_relative_year,
+            raster_profile,
+        ):
+            write_lookup_rasters(task_reader, lookups, raster_profile)
+            complete(stages)
+
+
+def _get_input_fingerprints(ds: ParquetGeoDataset) -> dict[str, str]:
+    # the inputs are keyed on the extraction manifest and their file stats
+    # rather than hashed, since the base raster may be several gigabytes
+    extraction_manifest = stage_cache.StageManifest(ds.data_dir)
+    fingerprints = {
+        table: stage_cache.input_fingerprint(
+            casfri_data.get_table_path(ds.data_dir, table),
+            extraction_manifest,
+            "parquet",
+        )
+        for table in ["lyr", "dst", "geo_lookup"]
+    }
+    fingerprints["raster"] = stage_cache.input_fingerprint(
+        ds.base_raster_path,
+        extraction_manifest,
+        "raster_wgs84" if ds.wgs84 else "raster",
+    )
+    fingerprints["wgs84"] = ds.wgs84
+    fingerprints["version"] = stage_cache.get_package_version()
+    return fingerprints
+
+
+def _iter_layer_tasks(
+    ds: ParquetGeoDataset,
+    reader: RasterChunkReader,
+    manifest: stage_cache.StageManifest,
+    out_dir: str,
+    lyr_layer_ids: list[int],
+    dst_layer_ids: list[int],
+    age_relative_year: int,
+    raster_profile: str = None,
+) -> Iterator[tuple[RasterChunkReader, dict[str, np.ndarray], list[tuple]]]:
+    """Yields the raster writing tasks for each layer whose outputs are not
+    current in the specified manifest.  Each task is a reader for the raster
+    to map, the lookups keyed by output path, and the manifest stage
+    entries to record once the outputs are written.  If the manifest is
+    None every layer is yielded, and the stage fingerprints are None.
+    """
+    inputs = None
+    if manifest is not None:
+        inputs = _get_input_fingerprints(ds)
+        inputs["raster_profile"] = vars(
+            gdal_helpers.get_raster_profile(raster_profile)
+        )
+
+    def is_current(stage: str, stage_fingerprint: str) -> bool:
+        if manifest is not None and manifest.is_current(
+            stage, stage_fingerprint
+        ):
+            logger.info(f"{stage} is up to date, skipping")
+            return True
+        return False
+
+    def get_fingerprint(layer_id: int, product: str, table: str) -> str:
+        if inputs is None:
+            return None
+        return stage_cache.fingerprint(
+            dict(
+                layer_id=layer_id,
+                product=product,
+                table=inputs[table],
+                geo_lookup=inputs["geo_lookup"],
+                raster=inputs["raster"],
+                wgs84=inputs["wgs84"],
+                raster_profile=inputs["raster_profile"],
+                version=inputs["version"],
+            )
+        )
+
+    def get_outputs(lookups: dict[str, np.ndarray], csv: bool) -> list[str]:
+        outputs = list(lookups.keys())
+        if csv:
+            outputs.extend([f"{os.path.splitext(p)[0]}.csv" for p in lookups])
+        return outputs
+
+    for layer_id in sorted(set(lyr_layer_ids).union(dst_layer_ids)):
+        subdir = get_layer_subdir(layer_id)
+        layer_subdir = os.path.join(out_dir, subdir)
+        lookups: dict[str, np.ndarray] = {}
+        stages: list[tuple] = []
+        if layer_id in lyr_layer_ids:
+            mean_origin_path = os.path.join(layer_subdir, "mean_origin.tiff")
+            age_path = os.path.join(
+                layer_subdir, f"age_{age_relative_year}.tiff"
+            )
+            origin_fingerprint = get_fingerprint(layer_id, "origin", "lyr")
+            age_fingerprint = (
+                None
+                if inputs is None
+                else stage_cache.fingerprint(
+                    dict(
+                        origin=origin_fingerprint,
+                        age_relative_year=age_relative_year,
+                    )
+                )
+            )
+            if not is_current(f"{subdir}.mean_origin", origin_fingerprint):
+                logger.info("process origin data")
+                lookups.update(
+                    process_origin(
+                        layer_id, ds, layer_subdir, age_relative_year
+                    )
+                )
+                stages.append(
+                    (
+                        f"{subdir}.mean_origin",
+                        origin_fingerprint,
+                        [mean_origin_path],
+                    )
+                )
+                stages.append((f"{subdir}.age", age_fingerprint, [age_path]))
+            elif not is_current(f"{subdir}.age", age_fingerprint):
+                logger.info("derive age from existing mean origin data")
+                yield (
+                    RasterChunkReader(mean_origin_path, ds.memory_limit_mb),
+                    {age_path: get_age_lookup(age_relative_year)},
+                    [(f"{subdir}.age", age_fingerprint, [age_path])],
+                )
+
+            for product, func in [
+                ("leading_species", process_leading_species),
+                ("species_composition", process_species_components),
+            ]:
+                product_fingerprint = get_fingerprint(layer_id, product, "lyr")
+                if is_current(f"{subdir}.{product}", product_fingerprint):
+                    continue
+                logger.info(f"process {product} data")
+                product_lookups = func(layer_id, ds, layer_subdir)
+                lookups.update(product_lookups)
+                stages.append(
+                    (
+                        f"{subdir}.{product}",
+                        product_fingerprint,
+                        get_outputs(product_lookups, csv=True),
+                    )
+                )
+        if layer_id in dst_layer_ids:
+            dist_fingerprint = get_fingerprint(layer_id, "disturbances", "dst")
+            if not is_current(f"{subdir}.disturbances", dist_fingerprint):
+                logger.info("process disturbance events data")
+                dist_lookups = process_disturbance_events(
+                    layer_id, ds, layer_subdir
+                )
+                lookups.update(dist_lookups)
+                stages.append(
+                    (
+                        f"{subdir}.disturbances",
+                        dist_fingerprint,
+                        get_outputs(dist_lookups, csv=True),
+                    )
+                )
+        if lookups:
+            logger.info(f"writing layer {layer_id} rasters")
+            yield reader, lookups, stages
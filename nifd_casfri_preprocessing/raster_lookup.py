@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+def get_lookup_size(geo_lookup: pd.DataFrame) -> int:
+    """Get the length of a lookup array able to hold every raster_id in the
+    specified geo_lookup table.
+
+    raster_id values are assigned by ROW_NUMBER() in
+    gdal_rasterization_lookup.sql and are therefore dense in the range 1..N.
+    Index 0 of every lookup array is reserved for the nodata value.
+
+    Args:
+        geo_lookup (pd.DataFrame): table with a raster_id column
+
+    Returns:
+        int: the lookup array length (max raster_id + 1)
+    """
+    if len(geo_lookup.index) == 0:
+        return 1
+    return int(geo_lookup["raster_id"].max()) + 1
+
+
+def create_lookup(
+    raster_ids: np.ndarray,
+    values: np.ndarray,
+    size: int,
+    nodata: int = -1,
+    dtype: type = np.int32,
+) -> np.ndarray:
+    """Create a dense array indexed by raster_id holding the specified
+    attribute values. raster_ids not specified are assigned nodata.
+
+    Args:
+        raster_ids (numpy.ndarray): the raster ids, must be in the range
+            [1, size)
+        values (numpy.ndarray): the attribute values, one per raster id
+        size (int): the length of the lookup array. See
+            :py:func:`get_lookup_size`
+        nodata (int, optional): value assigned to undefined raster ids.
+            Defaults to -1.
+        dtype (type, optional): the lookup array numeric type. Defaults to
+            np.int32.
+
+    Raises:
+        ValueError: raster ids are outside of the range [1, size)
+
+    Returns:
+        numpy.ndarray: the lookup array
+    """
+    raster_ids = np.asarray(raster_ids, dtype=np.int64)
+    lookup = np.full(size, nodata, dtype=dtype)
+    if raster_ids.shape[0] == 0:
+        return lookup
+    if raster_ids.min() < 1 or raster_ids.max() >= size:
+        raise ValueError(f"raster ids must be in the range [1, {size})")
+    lookup[raster_ids] = np.asarray(values)
+    return lookup
+
+
+def apply_lookup(
+    lookup: np.ndarray, raster: np.ndarray, raster_nodata: int = None
+) -> np.ndarray:
+    """Map a raster of raster_id values to attribute values with a single
+    gather on the specified lookup array.  Raster pixels that are nodata, or
+    that have no entry in the lookup are assigned the lookup nodata value
+    stored at index 0.
+
+    Args:
+        lookup (numpy.ndarray): lookup array produced by
+            :py:func:`create_lookup`
+        raster (numpy.ndarray): array of raster_id values
+        raster_nodata (int, optional): the nodata value of the raster.
+            Defaults to None.
+
+    Returns:
+        numpy.ndarray: array of the same shape as raster with the mapped
+            attribute values
+    """
+    valid = (raster > 0) & (raster < lookup.shape[0])
+    if raster_nodata is not None:
+        valid &= raster != raster_nodata
+    return lookup.take(np.where(valid, raster, 0))
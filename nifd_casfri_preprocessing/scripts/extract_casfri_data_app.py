@@ -3,6 +3,7 @@ import sys
 import argparse
 import time
 from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
 from nifd_casfri_preprocessing import log_helper
 
 
@@ -41,6 +42,84 @@ def extract_main(args):
         ),
         required=False,
     )
+    parser.add_argument(
+        "--max_connections",
+        help=(
+            "the maximum number of database connections used to extract "
+            "parquet tables concurrently"
+        ),
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--batch_size",
+        help=(
+            "optional number of rows per parquet row group. If set, tables "
+            "are streamed to parquet in batches of this size through a "
+            "server-side cursor, rather than loaded in full before writing"
+        ),
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--no_copy",
+        help=(
+            "flag, if set, parquet tables are read with pandas.read_sql "
+            "rather than with the postgresql COPY bulk reader"
+        ),
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--rasterize_workers",
+        help=(
+            "optional number of processes used to rasterize cas_id. If "
+            "greater than 1 the raster is split into tiles that are "
+            "rasterized concurrently, otherwise a single gdal.Rasterize call "
+            "is used"
+        ),
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--raster_profile",
+        help=(
+            "the output GeoTIFF profile: internal tiling, compression, "
+            "predictor, threads and overviews. Defaults to "
+            f"'{gdal_helpers.DEFAULT_RASTER_PROFILE}'"
+        ),
+        choices=list(gdal_helpers.RASTER_PROFILES.keys()),
+        required=False,
+    )
+    parser.add_argument(
+        "--wgs84",
+        help=(
+            "flag, if set, a wgs84 version of the cas_id raster is also "
+            "created. Otherwise it is created when first required by "
+            "nifd_casfri_process --wgs84"
+        ),
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--partitioned",
+        help=(
+            "flag, if set, tables with a layer column are written as hive "
+            "partitioned parquet datasets (eg. lyr/layer=1/) sorted by "
+            "cas_id"
+        ),
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--ignore_cache",
+        help=(
+            "flag, if set, parquet tables and rasters are extracted even if "
+            "the database is unchanged since they were last extracted"
+        ),
+        required=False,
+        action="store_true",
+    )
     args = parser.parse_args(args=args)
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
@@ -72,6 +151,14 @@ def extract_main(args):
                 args.output_dir,
                 args.inventory_id,
                 args.resolution,
+                use_cache=not args.ignore_cache,
+                max_connections=args.max_connections,
+                batch_size=args.batch_size,
+                partitioned=args.partitioned,
+                use_copy=not args.no_copy,
+                rasterize_workers=args.rasterize_workers,
+                raster_profile=args.raster_profile,
+                wgs84=args.wgs84,
             )
 
     except Exception:
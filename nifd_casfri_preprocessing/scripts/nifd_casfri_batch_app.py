@@ -0,0 +1,152 @@
+import os
+import sys
+import argparse
+import time
+from nifd_casfri_preprocessing import batch
+from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
+from nifd_casfri_preprocessing import log_helper
+
+
+def batch_app_main(args):
+    parser = argparse.ArgumentParser(
+        description=(
+            "Extract, process and summarize several inventories from the "
+            "nfid casfri db"
+        )
+    )
+    for db_info in ["host", "port", "database", "username", "password"]:
+        parser.add_argument(
+            f"--{db_info}", help="database connection info", required=True
+        )
+    parser.add_argument(
+        "--inventory_ids",
+        help=(
+            "The inventory ids within the casfri db to run. Eg. 'AB01 PE01', "
+            "or 'all' to run every inventory defined in hdr_all"
+        ),
+        nargs="+",
+        required=True,
+    )
+    parser.add_argument(
+        "--output_dir",
+        help=(
+            "The directory into which a subdirectory for each inventory is "
+            "written"
+        ),
+        required=True,
+        type=os.path.abspath,
+    )
+    parser.add_argument(
+        "--resolution",
+        help="the rasterization resolution in metres",
+        required=True,
+    )
+    parser.add_argument(
+        "--age_relative_year",
+        help=(
+            "The reference calendar year for the processed age rasters. "
+            "Eg '2022'"
+        ),
+        type=int,
+        required=True,
+    )
+    parser.add_argument(
+        "--wgs84",
+        help=(
+            "flag, if set, indicates that processed rasters should be in "
+            "wgs84 projection"
+        ),
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--memory_limit_mb",
+        help="optional memory limit for processing, see nifd_casfri_process",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--max_connections",
+        help="maximum number of database connections used per extraction",
+        type=int,
+        default=4,
+    )
+    parser.add_argument(
+        "--batch_size",
+        help="optional row group size for streamed extraction",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--partitioned",
+        help="flag, if set, extract layered tables partitioned by layer",
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--raster_profile",
+        help=(
+            "the output GeoTIFF profile: internal tiling, compression, "
+            "predictor, threads and overviews. Defaults to "
+            f"'{gdal_helpers.DEFAULT_RASTER_PROFILE}'"
+        ),
+        choices=list(gdal_helpers.RASTER_PROFILES.keys()),
+        required=False,
+    )
+    parser.add_argument(
+        "--io_workers",
+        help="maximum number of concurrent database extractions",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--cpu_workers",
+        help="maximum number of concurrent processing and summary jobs",
+        type=int,
+        default=1,
+    )
+
+    args = parser.parse_args(args=args)
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+    log_helper.start_logging(args.output_dir, "INFO")
+    logger = log_helper.get_logger()
+    inventory_ids = args.inventory_ids
+    if len(inventory_ids) == 1 and inventory_ids[0].lower() == "all":
+        inventory_ids = "all"
+    try:
+        start_time = time.time()
+        logger.info("process start")
+        status = batch.run_batch(
+            args.username,
+            args.password,
+            args.host,
+            args.port,
+            args.database,
+            args.output_dir,
+            inventory_ids,
+            args.resolution,
+            args.age_relative_year,
+            args.wgs84,
+            memory_limit_mb=args.memory_limit_mb,
+            max_connections=args.max_connections,
+            batch_size=args.batch_size,
+            partitioned=args.partitioned,
+            raster_profile=args.raster_profile,
+            io_workers=args.io_workers,
+            cpu_workers=args.cpu_workers,
+        )
+        failed = [k for k, v in status.items() if not v]
+        if failed:
+            logger.error(f"failed jobs: {failed}")
+    except Exception:
+        logger.exception("")
+    logger.info(f"process end. Run time: {time.time() - start_time}")
+
+
+def main():
+    batch_app_main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,10 @@ import os
 import sys
 import argparse
 import time
+from nifd_casfri_preprocessing import casfri_data
+from nifd_casfri_preprocessing import data_summary
 from nifd_casfri_preprocessing import log_helper
+from nifd_casfri_preprocessing import summary_report
 from nifd_casfri_preprocessing.notebooks import report_writer
 
 
@@ -15,7 +18,12 @@ def summary_app_main(args):
     )
     parser.add_argument(
         "--inventory_id",
-        help=("a casfri inventory id string (eg PE01)"),
+        help=(
+            "a casfri inventory id string (eg PE01). If the database "
+            "connection info is specified instead of --raw_table_dir, "
+            "several inventory ids, or `all` may be specified"
+        ),
+        nargs="+",
         required=True,
     )
     parser.add_argument(
@@ -24,9 +32,57 @@ def summary_app_main(args):
             "a directory containing parquet formatted raw casfri attribute "
             "tables"
         ),
-        required=True,
+        required=False,
         type=os.path.abspath,
     )
+    for db_info in ["host", "port", "database", "username", "password"]:
+        parser.add_argument(
+            f"--{db_info}",
+            help=(
+                "database connection info. If specified instead of "
+                "--raw_table_dir, the summary tables are aggregated in the "
+                "database and written without a report"
+            ),
+            required=False,
+        )
+    parser.add_argument(
+        "--out_of_core",
+        help=(
+            "flag, if set the raw_table_dir tables are summarized by "
+            "streaming queries rather than loaded into memory"
+        ),
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--memory_limit_mb",
+        help="optional memory limit for the --out_of_core summary",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--html_report",
+        help=(
+            "flag, if set the report is rendered directly to static html and "
+            "figure files rather than by executing a jupyter notebook. "
+            "With database connection info, a report is also written for "
+            "each inventory"
+        ),
+        required=False,
+        action="store_true",
+    )
+    parser.add_argument(
+        "--workers",
+        help="optional number of --html_report figure rendering processes",
+        type=int,
+        required=False,
+    )
+    parser.add_argument(
+        "--max_connections",
+        help="the maximum number of concurrent database summary queries",
+        type=int,
+        default=4,
+    )
     parser.add_argument(
         "--report_output_dir",
         help=(
@@ -38,6 +94,20 @@ def summary_app_main(args):
     )
 
     args = parser.parse_args(args=args)
+    db_args = [
+        args.host,
+        args.port,
+        args.database,
+        args.username,
+        args.password,
+    ]
+    if args.raw_table_dir:
+        if len(args.inventory_id) != 1:
+            parser.error("specify a single --inventory_id with raw_table_dir")
+    elif not all(db_args):
+        parser.error(
+            "specify either --raw_table_dir or the database connection info"
+        )
     if not os.path.exists(args.report_output_dir):
         os.makedirs(args.report_output_dir)
     log_helper.start_logging(args.report_output_dir, "INFO")
@@ -48,15 +118,62 @@ def summary_app_main(args):
         log_helper.get_logger().info("process start")
         if not os.path.exists(args.report_output_dir):
             os.makedirs(args.report_output_dir)
-        report_writer.generate_report(
-            "summarize_casfri_inventory.md",
-            os.path.join(args.report_output_dir, f"{args.inventory_id}"),
-            parameters=dict(
-                inventory_id=args.inventory_id,
-                raw_data_path=args.raw_table_dir,
-                output_path=args.report_output_dir,
-            ),
-        )
+        if args.raw_table_dir and args.html_report:
+            inventory_id = args.inventory_id[0]
+            summary = data_summary.load_summary(
+                args.raw_table_dir,
+                out_of_core=args.out_of_core,
+                memory_limit_mb=args.memory_limit_mb,
+            )
+            summary.save_summary_tables(args.report_output_dir)
+            summary_report.write_html_report(
+                inventory_id,
+                summary,
+                args.report_output_dir,
+                workers=args.workers,
+            )
+        elif args.raw_table_dir:
+            inventory_id = args.inventory_id[0]
+            report_writer.generate_report(
+                "summarize_casfri_inventory.md",
+                os.path.join(args.report_output_dir, f"{inventory_id}"),
+                parameters=dict(
+                    inventory_id=inventory_id,
+                    raw_data_path=args.raw_table_dir,
+                    output_path=args.report_output_dir,
+                    out_of_core=args.out_of_core,
+                    memory_limit_mb=args.memory_limit_mb,
+                ),
+            )
+        else:
+            url = str(
+                casfri_data.get_sqlachemy_url(
+                    "postgresql",
+                    args.username,
+                    args.password,
+                    args.host,
+                    args.port,
+                    args.database,
+                )
+            )
+            inventory_ids = args.inventory_id
+            if len(inventory_ids) == 1 and inventory_ids[0].lower() == "all":
+                inventory_ids = casfri_data.get_inventory_ids(url)
+            summaries = data_summary.load_database_summaries(
+                url, inventory_ids, args.max_connections
+            )
+            for inventory_id, summary in summaries.items():
+                inventory_dir = os.path.join(
+                    args.report_output_dir, inventory_id
+                )
+                summary.save_summary_tables(inventory_dir)
+                if args.html_report:
+                    summary_report.write_html_report(
+                        inventory_id,
+                        summary,
+                        inventory_dir,
+                        workers=args.workers,
+                    )
 
     except Exception:
         log_helper.get_logger().exception("")
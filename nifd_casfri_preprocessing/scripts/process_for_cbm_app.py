@@ -2,8 +2,10 @@ import os
 import sys
 import argparse
 import time
+from nifd_casfri_preprocessing import area_reconciliation
 from nifd_casfri_preprocessing import log_helper
 from nifd_casfri_preprocessing import process_for_cbm
+from nifd_casfri_preprocessing.gis_helpers import gdal_helpers
 
 
 def process_app_main(args):
@@ -50,6 +52,89 @@ def process_app_main(args):
         action="store_true",
     )
 
+    parser.add_argument(
+        "--wgs84_resolution",
+        help=(
+            "optional resolution in degrees of the wgs84 cas_id raster. If "
+            "not set the resolution suggested by gdal is used."
+        ),
+        type=float,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--wgs84_align_origin",
+        help=(
+            "optional longitude and latitude of a target grid corner, for "
+            "example of a GCBM tile, to which the wgs84 pixel edges are "
+            "snapped"
+        ),
+        type=float,
+        nargs=2,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--warp_memory_mb",
+        help="working buffer size in megabytes of the wgs84 warp",
+        type=int,
+        default=512,
+    )
+
+    parser.add_argument(
+        "--memory_limit_mb",
+        help=(
+            "optional approximate limit in megabytes on the raster data held "
+            "in memory. If set, the cas_id raster is processed in blocks "
+            "aligned to its internal tiling, otherwise it is loaded in full."
+        ),
+        type=int,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--workers",
+        help=(
+            "optional number of worker processes used to write the output "
+            "rasters. If not set, outputs are written in the main process."
+        ),
+        type=int,
+        required=False,
+    )
+
+    parser.add_argument(
+        "--raster_profile",
+        help=(
+            "the output GeoTIFF profile: internal tiling, compression, "
+            "predictor, threads and overviews. Defaults to "
+            f"'{gdal_helpers.DEFAULT_RASTER_PROFILE}'"
+        ),
+        choices=list(gdal_helpers.RASTER_PROFILES.keys()),
+        required=False,
+    )
+
+    parser.add_argument(
+        "--area_reconciliation",
+        help=(
+            "flag, if set, the rasterized area of each cas_id is compared "
+            "with its casfri_area and written to "
+            "area_reconciliation_by_cas_id.parquet and "
+            "area_reconciliation_by_inventory.csv in the output directory"
+        ),
+        required=False,
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--ignore_cache",
+        help=(
+            "flag, if set, all outputs are regenerated even if their inputs "
+            "are unchanged since they were last produced"
+        ),
+        required=False,
+        action="store_true",
+    )
+
     args = parser.parse_args(args=args)
     if not os.path.exists(args.out_dir):
         os.makedirs(args.out_dir)
@@ -64,7 +149,26 @@ def process_app_main(args):
             wgs84=args.wgs84,
             age_relative_year=args.age_relative_year,
             out_dir=args.out_dir,
+            memory_limit_mb=args.memory_limit_mb,
+            workers=args.workers,
+            use_cache=not args.ignore_cache,
+            raster_profile=args.raster_profile,
+            wgs84_resolution=args.wgs84_resolution,
+            wgs84_align_origin=(
+                tuple(args.wgs84_align_origin)
+                if args.wgs84_align_origin
+                else None
+            ),
+            warp_memory_mb=args.warp_memory_mb,
         )
+        if args.area_reconciliation:
+            area_reconciliation.write_area_reconciliation(
+                data_dir=args.data_dir,
+                out_dir=args.out_dir,
+                wgs84=args.wgs84,
+                memory_limit_mb=args.memory_limit_mb,
+                use_cache=not args.ignore_cache,
+            )
     except Exception:
         log_helper.get_logger().exception("")
     log_helper.get_logger().info(
@@ -20,7 +20,128 @@ def get_inventory_id_fitered_query(name: str, inventory_id: str) -> str:
         return fp.read().format(inventory_id=inventory_id)
 
 
+def get_query(name: str) -> str:
+    with open(os.path.join(_get_script_dir(), f"{name}.sql")) as fp:
+        return fp.read()
+
+
 def get_unfiltered_query(name: str):
     if name not in NAMES:
         raise ValueError()
     return f"SELECT * from {name}"
+
+
+def _get_where_clause(conditions: list[str]) -> str:
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def _get_inventory_id_conditions(
+    inventory_ids: list[str], alias: str = "cas"
+) -> list[str]:
+    if inventory_ids is None:
+        return []
+    quoted = ", ".join(
+        "'{}'".format(inventory_id.replace("'", "''"))
+        for inventory_id in inventory_ids
+    )
+    return [f"{alias}.inventory_id IN ({quoted})"]
+
+
+def get_hdr_query(inventory_ids: list[str]) -> str:
+    """Generate a query for the hdr_all rows of the specified inventories
+
+    Args:
+        inventory_ids (list[str]): the inventory ids
+
+    Returns:
+        str: the query
+    """
+    conditions = _get_inventory_id_conditions(inventory_ids, "hdr_all")
+    return f"SELECT hdr_all.* FROM hdr_all {_get_where_clause(conditions)}"
+
+
+def get_area_distribution_query(
+    table: str,
+    table_source: str,
+    cas_source: str,
+    columns: list[str],
+    by_layer: bool,
+    inventory_ids: list[str] = None,
+) -> str:
+    """Generate a query that sums casfri_area by inventory_id, optionally
+    layer, and the value of each of the specified columns in a single scan
+    of the table, using one grouping set per column.  In each result row
+    exactly one of the columns is non-null, being the grouped column, except
+    for the rows of null values, which are not part of any distribution.
+
+    Args:
+        table (str): the casfri table name, for example "lyr"
+        table_source (str): the sql expression for the table, for example
+            "lyr_all", or a table function reading parquet
+        cas_source (str): the sql expression for the cas table
+        columns (list[str]): the columns to summarize
+        by_layer (bool): if set, the table layer column is part of each
+            grouping set
+        inventory_ids (list[str], optional): if specified, only these
+            inventories are summarized. Defaults to None.
+
+    Returns:
+        str: the query
+    """
+    alias = "cas" if table == "cas" else "t"
+    keys = ["cas.inventory_id"]
+    if by_layer:
+        keys.append(f"{alias}.layer")
+    select = ", ".join(keys + [f"{alias}.{column}" for column in columns])
+    grouping_sets = ", ".join(
+        "({})".format(", ".join(keys + [f"{alias}.{column}"]))
+        for column in columns
+    )
+    source = f"{cas_source} AS cas"
+    if table != "cas":
+        source = (
+            f"{table_source} AS t INNER JOIN {cas_source} AS cas "
+            "ON cas.cas_id = t.cas_id"
+        )
+    return (
+        f"SELECT {select}, "
+        "SUM(COALESCE(cas.casfri_area, 0)) AS casfri_area "
+        f"FROM {source} "
+        f"{_get_where_clause(_get_inventory_id_conditions(inventory_ids))} "
+        f"GROUP BY GROUPING SETS ({grouping_sets})"
+    )
+
+
+def get_table_area_query(
+    table_sources: dict[str, str],
+    cas_source: str,
+    inventory_ids: list[str] = None,
+) -> str:
+    """Generate a query for the total casfri_area of the distinct cas_ids of
+    each of the specified tables, by inventory_id
+
+    Args:
+        table_sources (dict[str, str]): the sql expression for each table by
+            casfri table name
+        cas_source (str): the sql expression for the cas table
+        inventory_ids (list[str], optional): if specified, only these
+            inventories are summarized. Defaults to None.
+
+    Returns:
+        str: a query with columns table_name, inventory_id and casfri_area
+    """
+    queries = []
+    for table, table_source in table_sources.items():
+        conditions = _get_inventory_id_conditions(inventory_ids)
+        if table != "cas":
+            conditions.append(
+                f"EXISTS (SELECT 1 FROM {table_source} AS t "
+                "WHERE t.cas_id = cas.cas_id)"
+            )
+        queries.append(
+            f"SELECT '{table}' AS table_name, cas.inventory_id, "
+            "SUM(cas.casfri_area) AS casfri_area "
+            f"FROM {cas_source} AS cas {_get_where_clause(conditions)} "
+            "GROUP BY cas.inventory_id"
+        )
+    return " UNION ALL ".join(queries)
@@ -0,0 +1 @@
+SELECT ST_SetSRID(ST_Extent(geo_all.geometry)::geometry, MIN(ST_SRID(geo_all.geometry))) AS geometry, MIN(ST_SRID(geo_all.geometry)) AS srid FROM geo_all inner join cas_all on cas_all.cas_id = geo_all.cas_id where cas_all.inventory_id = '{inventory_id}'
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT geo_all.geometry, geo_all.cas_id, ROW_NUMBER() OVER (ORDER BY geo_all.cas_id) AS tile_index FROM geo_all
+inner join cas_all on cas_all.cas_id = geo_all.cas_id
+where cas_all.inventory_id = '{inventory_id}' and geo_all.geometry && ST_MakeEnvelope({{xmin}}, {{ymin}}, {{xmax}}, {{ymax}}, {{srid}})
+ORDER BY geo_all.cas_id
\ No newline at end of file
@@ -0,0 +1 @@
+SELECT DISTINCT inventory_id FROM hdr_all ORDER BY inventory_id
\ No newline at end of file
@@ -0,0 +1,4 @@
+SELECT schemaname, relname, n_tup_ins + n_tup_upd + n_tup_del AS n_modified, pg_relation_filenode(relid) AS filenode
+FROM pg_stat_user_tables
+WHERE relid IN (SELECT to_regclass(name) FROM unnest(ARRAY['hdr_all', 'cas_all', 'dst_all', 'eco_all', 'geo_all', 'lyr_all', 'nfl_all']) AS name)
+ORDER BY schemaname, relname
\ No newline at end of file
@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+from importlib import metadata
+from typing import Any
+from typing import Union
+from nifd_casfri_preprocessing import log_helper
+
+logger = log_helper.get_logger()
+
+MANIFEST_FILENAME = "manifest.json"
+
+
+def get_package_version() -> str:
+    """Get the installed version of this package, which is part of every
+    stage fingerprint so that upgrades invalidate cached outputs.
+    """
+    try:
+        return metadata.version("nifd_casfri_preprocessing")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def stat_path(path: str) -> str:
+    """Compute a digest of the size and modification time of a file, or of
+    the relative paths, sizes and modification times of every file in a
+    directory.  The contents are not read, so a file rewritten with the
+    same size and modification time is not detected.
+
+    Args:
+        path (str): path to a file or directory
+
+    Returns:
+        str: the hex digest
+    """
+    if not os.path.isdir(path):
+        paths = [path]
+    else:
+        paths = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            paths.extend(os.path.join(root, f) for f in sorted(files))
+    path_hash = hashlib.sha256()
+    for file_path in paths:
+        stat = os.stat(file_path)
+        path_hash.update(
+            f"{os.path.relpath(file_path, path)}:{stat.st_size}:"
+            f"{stat.st_mtime_ns};".encode("utf-8")
+        )
+    return path_hash.hexdigest()
+
+
+def fingerprint(inputs: dict[str, Any]) -> str:
+    """Compute a fingerprint for the specified stage inputs.
+
+    Args:
+        inputs (dict[str, Any]): json serializable description of every
+            input that affects a stage's outputs
+
+    Returns:
+        str: the hex digest of the inputs
+    """
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class StageManifest:
+    """Records the input fingerprint and output files of each stage run
+    in a directory, in a manifest file stored in the same directory.  A
+    stage whose fingerprint is unchanged and whose outputs all exist does
+    not need to be re-run.
+
+    Args:
+        directory (str): the directory containing the stage outputs
+    """
+
+    def __init__(self, directory: str):
+        self._path = os.path.join(directory, MANIFEST_FILENAME)
+        self._directory = directory
+        self._stages: dict[str, dict[str, Any]] = {}
+        if os.path.exists(self._path):
+            with open(self._path) as fp:
+                self._stages = json.load(fp)["stages"]
+
+    def is_current(self, stage: str, stage_fingerprint: str) -> bool:
+        """Check if the outputs of the specified stage were produced from
+        inputs with the specified fingerprint and still exist.
+
+        Args:
+            stage (str): the stage name
+            stage_fingerprint (str): the fingerprint of the current inputs
+
+        Returns:
+            bool: True if the stage can be skipped
+        """
+        entry = self._stages.get(stage)
+        if not entry or entry["fingerprint"] != stage_fingerprint:
+            return False
+        return all(
+            os.path.exists(os.path.join(self._directory, output))
+            for output in entry["outputs"]
+        )
+
+    def get_fingerprint(self, stage: str) -> Union[str, None]:
+        """Get the recorded fingerprint of the specified stage
+
+        Args:
+            stage (str): the stage name
+
+        Returns:
+            str, None: the fingerprint, or None if the stage is not recorded
+                or any of its outputs no longer exist
+        """
+        entry = self._stages.get(stage)
+        if not entry or not all(
+            os.path.exists(os.path.join(self._directory, output))
+            for output in entry["outputs"]
+        ):
+            return None
+        return entry["fingerprint"]
+
+    def record(
+        self, stage: str, stage_fingerprint: str, outputs: list[str]
+    ) -> None:
+        """Record that the specified stage completed and save the manifest
+
+        Args:
+            stage (str): the stage name
+            stage_fingerprint (str): the fingerprint of the stage inputs
+            outputs (list[str]): paths to the stage outputs
+        """
+        self._stages[stage] = {
+            "fingerprint": stage_fingerprint,
+            "outputs": [
+                os.path.relpath(output, self._directory) for output in outputs
+            ],
+        }
+        self._save()
+
+    def invalidate(self, stage: str) -> None:
+        """Remove the specified stage from the manifest and save it
+
+        Args:
+            stage (str): the stage name
+        """
+        if self._stages.pop(stage, None) is not None:
+            self._save()
+
+    def _save(self) -> None:
+        if not os.path.exists(self._directory):
+            os.makedirs(self._directory)
+        temp_path = f"{self._path}.tmp"
+        with open(temp_path, "w") as fp:
+            json.dump({"stages": self._stages}, fp, indent=2, sort_keys=True)
+        os.replace(temp_path, self._path)
+
+
+def input_fingerprint(
+    path: str, manifest: StageManifest = None, stage: str = None
+) -> str:
+    """Compute a fingerprint for an input of a stage that was produced by an
+    earlier stage, for example an extracted table or raster, without
+    reading its contents.  The fingerprint combines the fingerprint
+    recorded for the producing stage with :py:func:`stat_path`, so that it
+    changes when the input is re-created or replaced.
+
+    Args:
+        path (str): path to the input file or directory
+        manifest (StageManifest, optional): the manifest of the directory
+            containing the input. Defaults to None.
+        stage (str, optional): the name of the stage in the manifest that
+            produced the input. Defaults to None.
+
+    Returns:
+        str: the fingerprint
+    """
+    return fingerprint(
+        dict(
+            stage=manifest.get_fingerprint(stage) if manifest else None,
+            stat=stat_path(path),
+        )
+    )
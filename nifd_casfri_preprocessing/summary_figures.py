@@ -0,0 +1,189 @@
+import os
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from nifd_casfri_preprocessing import log_helper
+
+logger = log_helper.get_logger()
+
+# numeric distributions with more distinct values than this are binned
+# before plotting
+MAX_FIGURE_POINTS = 1000
+
+# each rendering process reuses a single figure
+_figure: Figure = None
+
+
+def downsample(
+    df: pd.DataFrame, max_points: int = MAX_FIGURE_POINTS
+) -> pd.DataFrame:
+    """Reduce a numeric valued summary distribution with more than
+    max_points distinct values, such as origin_upper or site_index, to
+    max_points equal width bins of the value range.  The area of each bin
+    is the sum of the area of its values, so the plotted total is kept.
+    Other distributions are returned unchanged.
+
+    Args:
+        df (pd.DataFrame): a summary distribution
+        max_points (int, optional): the maximum number of plotted values.
+            Defaults to MAX_FIGURE_POINTS.
+
+    Returns:
+        pd.DataFrame: the distribution indexed by bin center if it was
+            binned, otherwise df
+    """
+    if len(df.index) <= max_points or not pd.api.types.is_numeric_dtype(
+        df.index
+    ):
+        return df
+    values = df.index.to_numpy(dtype="float64")
+    edges = np.linspace(values.min(), values.max(), max_points + 1)
+    bins = np.clip(
+        np.searchsorted(edges, values, side="right") - 1, 0, max_points - 1
+    )
+    present = np.bincount(bins, minlength=max_points) > 0
+    centers = (edges[:-1] + edges[1:]) / 2
+    return pd.DataFrame(
+        {
+            column: np.bincount(
+                bins,
+                weights=df[column].to_numpy(dtype="float64"),
+                minlength=max_points,
+            )[present]
+            for column in df.columns
+        },
+        index=pd.Index(centers[present], name=df.index.name),
+    )
+
+
+def get_figure_key(df: pd.DataFrame) -> str:
+    """Get a key identifying the figure of a summary distribution.  Equal
+    distributions of the same column with the same value columns, for
+    example the undefined species columns of several layers, have the same
+    key and share a figure.
+
+    Args:
+        df (pd.DataFrame): a summary distribution
+
+    Returns:
+        str: the hex digest of the distribution
+    """
+    figure_hash = hashlib.sha256(
+        repr((df.index.name, list(df.columns))).encode("utf-8")
+    )
+    figure_hash.update(
+        pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()
+    )
+    return figure_hash.hexdigest()
+
+
+def _get_figure() -> Figure:
+    global _figure
+    if _figure is None:
+        _figure = Figure(figsize=(15, 5))
+        FigureCanvasAgg(_figure)
+    else:
+        _figure.clear()
+    return _figure
+
+
+def render_figure(df: pd.DataFrame, path: str) -> str:
+    """Render the figure of a summary distribution to a file with the Agg
+    canvas, without a display or pyplot state.  The file format is
+    determined by the path extension, for example png or svg.  The figure
+    is written to a temporary file in the same directory which then
+    replaces the output, so an interrupted render does not leave a partial
+    file that would be reused by a later report.
+
+    Args:
+        df (pd.DataFrame): a summary distribution, see :py:func:`downsample`
+        path (str): the output path
+
+    Returns:
+        str: the output path
+    """
+    figure = _get_figure()
+    ax = figure.add_subplot()
+    if pd.api.types.is_numeric_dtype(df.index) and len(df.index) > 1:
+        df.plot(ax=ax, marker="o", linestyle="none")
+    else:
+        df.plot(ax=ax, kind="bar")
+    root, ext = os.path.splitext(path)
+    fd, temp_path = tempfile.mkstemp(
+        suffix=ext,
+        prefix=f"{os.path.basename(root)}.",
+        dir=os.path.dirname(path),
+    )
+    os.close(fd)
+    try:
+        # matches the cropping of the notebook inline backend
+        figure.savefig(temp_path, bbox_inches="tight")
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return path
+
+
+def add_figure(
+    figures: dict[str, pd.DataFrame],
+    df: pd.DataFrame,
+    figure_dir: str,
+    figure_format: str = "png",
+) -> str:
+    """Add the figure of a summary distribution to a collection of figures
+    to be rendered by :py:func:`render_figures`.
+
+    Args:
+        figures (dict[str, pd.DataFrame]): the collection of figures, the
+            distribution of each figure by output path
+        df (pd.DataFrame): a summary distribution
+        figure_dir (str): the directory containing the figures
+        figure_format (str, optional): the figure file format. Defaults to
+            "png".
+
+    Returns:
+        str: the figure path, which is shared by equal distributions
+    """
+    df = downsample(df)
+    path = os.path.join(figure_dir, f"{get_figure_key(df)}.{figure_format}")
+    figures[path] = df
+    return path
+
+
+def render_figures(
+    figures: dict[str, pd.DataFrame], workers: int = None
+) -> None:
+    """Render the specified figures on a pool of processes.  Figures whose
+    file already exists, for example from a previous report, are not
+    rendered again.
+
+    Args:
+        figures (dict[str, pd.DataFrame]): the distribution of each figure
+            by output path
+        workers (int, optional): the number of worker processes. Defaults to
+            None, which uses the number of processors.
+    """
+    pending = {
+        path: df for path, df in figures.items() if not os.path.exists(path)
+    }
+    logger.info(f"rendering {len(pending)} of {len(figures)} figures")
+    if not pending:
+        return
+    for figure_dir in set(os.path.dirname(path) for path in pending):
+        if not os.path.exists(figure_dir):
+            os.makedirs(figure_dir)
+    n_workers = workers if workers else os.cpu_count() or 1
+    chunksize = max(1, len(pending) // (n_workers * 4))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        for _ in executor.map(
+            render_figure,
+            pending.values(),
+            pending.keys(),
+            chunksize=chunksize,
+        ):
+            pass
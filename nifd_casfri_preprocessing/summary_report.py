@@ -0,0 +1,77 @@
+import os
+import html
+import pandas as pd
+from nifd_casfri_preprocessing import summary_figures
+from nifd_casfri_preprocessing.data_summary import Summary
+
+FIGURE_DIR = "figures"
+
+
+def _table_html(df: pd.DataFrame) -> str:
+    return df.to_html(border=0)
+
+
+def write_html_report(
+    inventory_id: str,
+    summary: Summary,
+    output_dir: str,
+    figure_format: str = "png",
+    workers: int = None,
+) -> str:
+    """Write the content of :py:func:`data_summary.display_summary` as a
+    static html report, with one figure file per distinct summary
+    distribution, without a jupyter kernel.
+
+    Args:
+        inventory_id (str): the inventory id
+        summary (Summary): the inventory summary
+        output_dir (str): the directory to which the html file and its
+            figure directory are written
+        figure_format (str, optional): the figure file format, "png" or
+            "svg". Defaults to "png".
+        workers (int, optional): the number of figure rendering processes.
+            Defaults to None, which uses the number of processors.
+
+    Returns:
+        str: the path to the html report
+    """
+    figure_dir = os.path.join(output_dir, FIGURE_DIR)
+    figures: dict[str, pd.DataFrame] = {}
+    body = [
+        f"<h1>{html.escape(inventory_id)}</h1>",
+        f"<h2>{html.escape(inventory_id)} hdr summary</h2>",
+        _table_html(summary.get_raw_table("hdr").transpose()),
+    ]
+    for table in summary.get_tables():
+        body.append(f"<h2>{table} summary</h2>")
+        for layer in summary.get_layers(table):
+            if layer is not None:
+                body.append(f"<h3>{table} summary: layer {layer}</h3>")
+            summary_data = summary.get_summary_data(table, layer)
+            for key, df in summary_data.items():
+                path = summary_figures.add_figure(
+                    figures, df, figure_dir, figure_format
+                )
+                body.append(f"<h4>{html.escape(key)}</h4>")
+                body.append(
+                    f'<img src="{FIGURE_DIR}/{os.path.basename(path)}" '
+                    f'alt="{html.escape(key)}">'
+                )
+            body.append(
+                f"<h4>{table} layer: {layer} null and undefined value "
+                "summary</h4>"
+            )
+            null_summary = summary.get_null_summary(table, layer)
+            if null_summary is not None:
+                body.append(_table_html(null_summary))
+
+    summary_figures.render_figures(figures, workers)
+    path = os.path.join(output_dir, f"{inventory_id}.html")
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{html.escape(inventory_id)}</title>\n</head>\n<body>\n"
+            + "\n".join(body)
+            + "\n</body>\n</html>\n"
+        )
+    return path
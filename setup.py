@@ -15,10 +15,12 @@ notebooks = [os.path.join("notebooks", "*.md")]
 extract_app = "nifd_casfri_preprocessing.scripts.extract_casfri_data_app:main"
 summary_app = "nifd_casfri_preprocessing.scripts.nifd_casfri_summary_app:main"
 process_app = "nifd_casfri_preprocessing.scripts.process_for_cbm_app:main"
+batch_app = "nifd_casfri_preprocessing.scripts.nifd_casfri_batch_app:main"
 console_scripts = [
     "nifd_casfri_extract = " + extract_app,
     "nifd_casfri_summary = " + summary_app,
     "nifd_casfri_process = " + process_app,
+    "nifd_casfri_batch = " + batch_app,
 ]
 
 setup(
@@ -0,0 +1,97 @@
+import threading
+import unittest
+import pyarrow as pa
+from nifd_casfri_preprocessing import casfri_data
+
+
+def _to_copy_csv(rows: list[tuple]) -> bytes:
+    # formats rows as postgres COPY csv: NULL is unquoted and empty, and
+    # text values are quoted
+    lines = ["id,label"]
+    for row_id, label in rows:
+        if label is None:
+            value = ""
+        else:
+            value = '"{}"'.format(label.replace('"', '""'))
+        lines.append(f"{row_id},{value}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _MockCursor:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def copy_expert(self, sql, writer):
+        for i in range(0, len(self._data), 1000):
+            writer.write(self._data[slice(i, i + 1000)])
+
+    def close(self):
+        pass
+
+
+class _MockConnection:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def cursor(self):
+        return _MockCursor(self._data)
+
+    def close(self):
+        pass
+
+
+class _MockEngine:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def raw_connection(self):
+        return _MockConnection(self._data)
+
+
+_SCHEMA = pa.schema([("id", pa.int64()), ("label", pa.string())])
+
+
+class CasfriDataTest(unittest.TestCase):
+    def test_read_copy_batches_multiline_values(self):
+        rows = []
+        for i in range(2000):
+            if i % 7 == 0:
+                label = f"line one {i}\nline two\r\nline three"
+            elif i % 5 == 0:
+                label = ""
+            elif i % 3 == 0:
+                label = None
+            else:
+                label = f'value, "{i}"'
+            rows.append((i, label))
+        engine = _MockEngine(_to_copy_csv(rows))
+        result = pa.Table.from_batches(
+            casfri_data.read_copy_batches(
+                engine, "SELECT 1", block_size=4096, schema=_SCHEMA
+            ),
+            schema=_SCHEMA,
+        )
+        self.assertEqual(result.column("id").to_pylist(), [r[0] for r in rows])
+        self.assertEqual(
+            result.column("label").to_pylist(), [r[1] for r in rows]
+        )
+
+    def test_read_copy_batches_raises_parse_error(self):
+        engine = _MockEngine(_to_copy_csv([(1, "a")]).replace(b"1,", b"x,"))
+        with self.assertRaises(pa.ArrowInvalid):
+            list(
+                casfri_data.read_copy_batches(
+                    engine, "SELECT 1", schema=_SCHEMA
+                )
+            )
+
+    def test_read_copy_batches_stopped_early(self):
+        rows = [(i, "x" * 100) for i in range(20000)]
+        engine = _MockEngine(_to_copy_csv(rows))
+        threads = threading.active_count()
+        batches = casfri_data.read_copy_batches(
+            engine, "SELECT 1", block_size=4096, schema=_SCHEMA
+        )
+        next(batches)
+        batches.close()
+        self.assertEqual(threading.active_count(), threads)
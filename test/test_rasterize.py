@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from osgeo import gdal
+from osgeo import ogr
+from osgeo import osr
+from nifd_casfri_preprocessing.gis_helpers import rasterize
+
+# overlapping squares, keyed so that key order differs from insertion order
+_SQUARES = [
+    ("c", 3, (10.3, 10.3, 60.7, 60.7)),
+    ("a", 1, (0.2, 0.2, 40.6, 40.6)),
+    ("b", 2, (25.1, 25.1, 90.9, 90.9)),
+    ("d", 4, (55.4, 5.4, 99.8, 45.8)),
+]
+
+_TILE_QUERY = (
+    "SELECT geom, key, ROW_NUMBER() OVER (ORDER BY key) AS tile_index "
+    "FROM squares WHERE ST_MaxX(geom) >= {xmin} AND ST_MinX(geom) <= {xmax} "
+    "AND ST_MaxY(geom) >= {ymin} AND ST_MinY(geom) <= {ymax} ORDER BY key"
+)
+
+
+def _create_squares(path: str) -> None:
+    spatial_ref = osr.SpatialReference()
+    spatial_ref.ImportFromEPSG(3857)
+    dataset = ogr.GetDriverByName("GPKG").CreateDataSource(path)
+    layer = dataset.CreateLayer("squares", spatial_ref, ogr.wkbPolygon)
+    layer.CreateField(ogr.FieldDefn("key", ogr.OFTString))
+    layer.CreateField(ogr.FieldDefn("value", ogr.OFTInteger))
+    for key, value, (min_x, min_y, max_x, max_y) in _SQUARES:
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField("key", key)
+        feature.SetField("value", value)
+        feature.SetGeometry(
+            ogr.CreateGeometryFromWkt(
+                f"POLYGON(({min_x} {min_y}, {max_x} {min_y}, "
+                f"{max_x} {max_y}, {min_x} {max_y}, {min_x} {min_y}))"
+            )
+        )
+        layer.CreateFeature(feature)
+    dataset = None
+
+
+def _read(path: str) -> tuple[tuple, np.ndarray]:
+    dataset = gdal.Open(path)
+    result = dataset.GetGeoTransform(), dataset.ReadAsArray()
+    dataset = None
+    return result
+
+
+class RasterizeTest(unittest.TestCase):
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self._temp_dir.name, "squares.gpkg")
+        _create_squares(self.source)
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_tiled_matches_single_rasterize(self):
+        untiled_path = os.path.join(self._temp_dir.name, "untiled.tiff")
+        tiled_path = os.path.join(self._temp_dir.name, "tiled.tiff")
+        gdal.Rasterize(
+            destNameOrDestDS=untiled_path,
+            srcDS=self.source,
+            options=gdal.RasterizeOptions(
+                SQLStatement="SELECT geom, value FROM squares ORDER BY key",
+                attribute="value",
+                xRes=1.0,
+                yRes=1.0,
+                noData=-1,
+                outputType=gdal.GDT_Int32,
+            ),
+        )
+        rasterize.rasterize_tiled(
+            source=self.source,
+            extent_sql_statement="SELECT geom FROM squares",
+            tile_sql_template=_TILE_QUERY,
+            dest_path=tiled_path,
+            key_field="key",
+            key_values=pd.Series(
+                [value for _, value, _ in _SQUARES],
+                index=[key for key, _, _ in _SQUARES],
+            ),
+            resolution=1.0,
+            creation_options=["TILED=YES", "BLOCKXSIZE=16", "BLOCKYSIZE=16"],
+            tile_size=32,
+            workers=2,
+        )
+        untiled_transform, untiled = _read(untiled_path)
+        tiled_transform, tiled = _read(tiled_path)
+        np.testing.assert_allclose(tiled_transform, untiled_transform)
+        np.testing.assert_array_equal(tiled, untiled)
+        # each square is visible where no later square overlaps it
+        self.assertEqual(set(np.unique(tiled)), {-1, 1, 2, 3, 4})
+
+    def test_duplicate_keys_raise(self):
+        with self.assertRaisesRegex(ValueError, "more than once"):
+            rasterize.rasterize_tiled(
+                source=self.source,
+                extent_sql_statement="SELECT geom FROM squares",
+                tile_sql_template=_TILE_QUERY,
+                dest_path=os.path.join(self._temp_dir.name, "dup.tiff"),
+                key_field="key",
+                key_values=pd.Series([1, 2], index=["a", "a"]),
+                resolution=1.0,
+            )